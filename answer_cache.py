@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+ANSWER_CACHE_PATH = os.path.join("data", "answer_cache.db")
+
+# Minimum cosine similarity between query embeddings for a cached answer to be served
+ANSWER_CACHE_THRESHOLD = 0.95
+
+# Cached answers older than this are ignored and pruned
+ANSWER_CACHE_MAX_AGE_SECONDS = 7 * 24 * 3600
+
+
+class AnswerCache:
+    """Semantic cache of generated answers stored in SQLite.
+
+    Answers are keyed by the embedding of the question and scoped by
+    collection, collection version and language. A lookup returns the
+    answer whose question embedding is most similar to the new one, if the
+    cosine similarity reaches the threshold. Bumping a collection's version
+    (see ``invalidate_collection``) makes all its cached answers unreachable.
+    """
+
+    def __init__(self, path=ANSWER_CACHE_PATH, max_age=ANSWER_CACHE_MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # (collection, version, language) -> (row ids, normalized embedding matrix)
+        self._matrices = {}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS collection_versions (
+                collection TEXT PRIMARY KEY,
+                version INTEGER NOT NULL
+            )
+            """
+            )
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                collection TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                language TEXT NOT NULL,
+                question TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_answers_scope "
+                "ON answers (collection, version, language)"
+            )
+
+    def get_collection_version(self, collection):
+        """Return the current version of a collection (0 if never changed)."""
+        row = self._conn.execute(
+            "SELECT version FROM collection_versions WHERE collection = ?",
+            (collection,),
+        ).fetchone()
+        return row[0] if row else 0
+
+    def invalidate_collection(self, collection):
+        """Bump a collection's version and drop the answers cached for it."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT INTO collection_versions (collection, version) VALUES (?, 1) "
+                    "ON CONFLICT (collection) DO UPDATE SET version = version + 1",
+                    (collection,),
+                )
+                self._conn.execute(
+                    "DELETE FROM answers WHERE collection = ?", (collection,)
+                )
+            self._matrices = {
+                scope: matrix
+                for scope, matrix in self._matrices.items()
+                if scope[0] != collection
+            }
+
+    def _load_matrix(self, scope):
+        """Load the normalized question embeddings for a scope into memory."""
+        cutoff = time.time() - self.max_age
+        rows = self._conn.execute(
+            "SELECT id, embedding FROM answers "
+            "WHERE collection = ? AND version = ? AND language = ? AND created_at >= ?",
+            (*scope, cutoff),
+        ).fetchall()
+        if not rows:
+            return [], None
+        ids = [row[0] for row in rows]
+        matrix = np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows])
+        return ids, matrix
+
+    def lookup(self, embedding, collection, language, threshold=ANSWER_CACHE_THRESHOLD):
+        """Find a cached answer for a question embedding.
+
+        Returns:
+            Tuple (answer, similarity) or None if nothing is similar enough
+        """
+        query = _normalize(embedding)
+        with self._lock:
+            scope = (collection, self.get_collection_version(collection), language)
+            if scope not in self._matrices:
+                self._matrices[scope] = self._load_matrix(scope)
+            ids, matrix = self._matrices[scope]
+
+            if matrix is None or matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < threshold:
+                self.misses += 1
+                return None
+
+            row = self._conn.execute(
+                "SELECT answer, created_at FROM answers WHERE id = ?", (ids[best],)
+            ).fetchone()
+            if row is None or row[1] < time.time() - self.max_age:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            return row[0], float(similarities[best])
+
+    def store(self, embedding, collection, language, question, answer):
+        """Cache the answer generated for a question."""
+        normalized = _normalize(embedding)
+        with self._lock:
+            version = self.get_collection_version(collection)
+            with self._conn:
+                c = self._conn.execute(
+                    "INSERT INTO answers (collection, version, language, question, embedding, answer, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        collection,
+                        version,
+                        language,
+                        question,
+                        normalized.tobytes(),
+                        answer,
+                        time.time(),
+                    ),
+                )
+                self._conn.execute(
+                    "DELETE FROM answers WHERE created_at < ?",
+                    (time.time() - self.max_age,),
+                )
+
+            scope = (collection, version, language)
+            if scope in self._matrices:
+                ids, matrix = self._matrices[scope]
+                if matrix is None:
+                    self._matrices[scope] = ([c.lastrowid], normalized[np.newaxis, :])
+                elif matrix.shape[1] == normalized.shape[0]:
+                    self._matrices[scope] = (
+                        ids + [c.lastrowid],
+                        np.vstack([matrix, normalized]),
+                    )
+
+    def stats(self):
+        """Return hit/miss counters for this process."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _normalize(embedding):
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
@@ -0,0 +1,133 @@
+"""Benchmark chat_db lookups before and after the index migration.
+
+Builds a scratch database with the chat_db schema, fills it with synthetic
+sessions and messages, and times the two hot queries (a session's messages
+and the recent-chats list) on the unindexed schema and again after the
+remaining migrations. Run from the repository root:
+
+    python benchmarks/chat_db_indexes.py --messages 1000000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_db import MIGRATIONS, run_migrations  # noqa: E402
+
+MESSAGES_QUERY = (
+    "SELECT role, content, images FROM messages WHERE session_id = ? ORDER BY timestamp"
+)
+SESSIONS_QUERY = (
+    "SELECT id, title, created_at FROM chat_sessions ORDER BY updated_at DESC LIMIT 50"
+)
+
+
+def populate(conn, n_messages, messages_per_session):
+    """Insert synthetic sessions and messages in large transactions."""
+    n_sessions = max(1, n_messages // messages_per_session)
+    start = datetime(2024, 1, 1)
+
+    sessions = []
+    for session_id in range(1, n_sessions + 1):
+        ts = (start + timedelta(seconds=random.randrange(10**7))).isoformat()
+        sessions.append((session_id, f"Chat {session_id}", ts, ts))
+    conn.executemany(
+        "INSERT INTO chat_sessions (id, title, created_at, updated_at) VALUES (?, ?, ?, ?)",
+        sessions,
+    )
+
+    batch = []
+    for i in range(n_messages):
+        session_id = random.randint(1, n_sessions)
+        ts = (start + timedelta(seconds=i)).isoformat()
+        role = "user" if i % 2 == 0 else "assistant"
+        batch.append((session_id, role, "How do I treat a burn?", None, ts))
+        if len(batch) >= 50_000:
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, images, timestamp) VALUES (?, ?, ?, ?, ?)",
+                batch,
+            )
+            batch.clear()
+    if batch:
+        conn.executemany(
+            "INSERT INTO messages (session_id, role, content, images, timestamp) VALUES (?, ?, ?, ?, ?)",
+            batch,
+        )
+    conn.commit()
+    return n_sessions
+
+
+def time_query(conn, sql, params_fn, repeats):
+    """Return the median latency in milliseconds of ``repeats`` runs."""
+    timings = []
+    for _ in range(repeats):
+        params = params_fn()
+        t0 = time.perf_counter()
+        conn.execute(sql, params).fetchall()
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    return timings[len(timings) // 2]
+
+
+def query_plan(conn, sql, params):
+    rows = conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return "; ".join(row[-1] for row in rows)
+
+
+def run(n_messages, messages_per_session, repeats):
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = sqlite3.connect(os.path.join(tmp, "bench.db"))
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+
+        # Schema as it was before the index migration
+        run_migrations(conn, target=1)
+        n_sessions = populate(conn, n_messages, messages_per_session)
+
+        def pick():
+            return (random.randint(1, n_sessions),)
+
+        for label in ("unindexed", "indexed"):
+            if label == "indexed":
+                t0 = time.perf_counter()
+                run_migrations(conn)
+                migrate_s = time.perf_counter() - t0
+                print(f"  migration to v{len(MIGRATIONS)}: {migrate_s:.2f}s")
+            msg_ms = time_query(conn, MESSAGES_QUERY, pick, repeats)
+            sess_ms = time_query(conn, SESSIONS_QUERY, lambda: (), repeats)
+            print(f"  {label:<9} messages: {msg_ms:8.3f} ms   sessions: {sess_ms:8.3f} ms")
+            print(f"            plan: {query_plan(conn, MESSAGES_QUERY, (1,))}")
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--per-session", type=int, default=40)
+    parser.add_argument("--repeats", type=int, default=25)
+    parser.add_argument(
+        "--scale",
+        action="store_true",
+        help="Also run at 1%% and 10%% of --messages to show how latency grows",
+    )
+    args = parser.parse_args()
+
+    sizes = [args.messages]
+    if args.scale:
+        sizes = [args.messages // 100, args.messages // 10, args.messages]
+
+    random.seed(0)
+    for n in sizes:
+        print(f"{n:,} messages")
+        run(n, args.per_session, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
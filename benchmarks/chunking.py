@@ -0,0 +1,181 @@
+"""Compare chunking strategies on a document corpus.
+
+For every strategy in chunking.CHUNKERS, and the fixed windows chunk_text
+used to cut before ("legacy"), chunks the corpus and reports the chunk
+count, chunk lengths and chunking time. Retrieval quality is estimated
+with sentence probes: sentences are sampled from the corpus, a query is
+made from each by dropping some of its words, and a probe is a hit when
+one of the top-k chunks returned by a BM25 retriever contains the whole
+sentence. "intact" is the share of probe sentences that are not cut by
+any chunk boundary at all. BM25 stands in for the embedding model so the
+benchmark runs offline and without API quota. Run from the repository
+root:
+
+    python benchmarks/chunking.py manuals/ extra.pdf --probes 500
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import CHUNKERS, NON_SPACE, SENTENCE_END, get_chunker, iter_chunks  # noqa: E402
+from document_processor import FILE_TYPES, iter_pdf_pages  # noqa: E402
+
+
+def load_corpus(paths):
+    """Return a list of (name, pages) for the supported files under ``paths``."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+
+    corpus = []
+    for path in files:
+        extension = os.path.splitext(path)[1].lower()
+        if extension not in FILE_TYPES:
+            continue
+        if extension == ".pdf":
+            pages = list(iter_pdf_pages(path))
+        else:
+            with open(path, encoding="utf-8") as f:
+                pages = [(None, f.read())]
+        corpus.append((path, pages))
+    return corpus
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def tokens(text):
+    return [token.lower() for token in NON_SPACE.findall(text)]
+
+
+def sample_probes(corpus, n, min_words=8, drop=0.3):
+    """Sample (sentence, query) pairs; queries miss ``drop`` of the sentence's words."""
+    sentences = []
+    for _, pages in corpus:
+        text = normalize("".join(text for _, text in pages))
+        start = 0
+        for match in SENTENCE_END.finditer(text + " "):
+            sentence = text[start:match.end()].strip()
+            start = match.end()
+            if len(sentence.split()) >= min_words:
+                sentences.append(sentence)
+
+    probes = []
+    for sentence in random.sample(sentences, min(n, len(sentences))):
+        words = sentence.split()
+        kept = [w for w in words if random.random() >= drop] or words
+        probes.append((sentence, " ".join(kept)))
+    return probes
+
+
+def legacy_chunks(text, chunk_size=1000, overlap=100):
+    """The fixed windows chunk_text produced before chunking.py, dropping short tails."""
+    if len(text) <= chunk_size:
+        return [text]
+    windows = (text[i:i + chunk_size] for i in range(0, len(text), chunk_size - overlap))
+    return [chunk for chunk in windows if len(chunk) >= chunk_size // 2]
+
+
+class BM25:
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.lengths = []
+        self.postings = defaultdict(list)
+        for i, document in enumerate(documents):
+            counts = Counter(tokens(document))
+            self.lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                self.postings[term].append((i, count))
+        self.average_length = sum(self.lengths) / max(1, len(self.lengths))
+
+    def search(self, query, k):
+        scores = defaultdict(float)
+        n = len(self.lengths)
+        for term in set(tokens(query)):
+            postings = self.postings.get(term, ())
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for i, count in postings:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.average_length)
+                scores[i] += idf * count * (self.k1 + 1) / (count + norm)
+        return sorted(scores, key=scores.get, reverse=True)[:k]
+
+
+def evaluate(strategy, corpus, probes, k):
+    start = time.perf_counter()
+    if strategy == "legacy":
+        chunks = [
+            chunk
+            for _, pages in corpus
+            for chunk in legacy_chunks("".join(text for _, text in pages))
+        ]
+    else:
+        chunker = get_chunker(strategy)
+        chunks = [chunk for _, pages in corpus for chunk, _, _ in iter_chunks(pages, chunker)]
+    elapsed = time.perf_counter() - start
+
+    normalized = [normalize(chunk) for chunk in chunks]
+    index = BM25(normalized)
+    hits = intact = 0
+    for sentence, query in probes:
+        if any(sentence in chunk for chunk in normalized):
+            intact += 1
+        if any(sentence in normalized[i] for i in index.search(query, k)):
+            hits += 1
+
+    lengths = [len(chunk) for chunk in chunks] or [0]
+    return {
+        "strategy": strategy,
+        "chunks": len(chunks),
+        "mean_len": sum(lengths) / len(lengths),
+        "max_len": max(lengths),
+        "seconds": elapsed,
+        "intact": intact / max(1, len(probes)),
+        f"hit@{k}": hits / max(1, len(probes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="Documents or directories of documents")
+    parser.add_argument("--probes", type=int, default=300, help="Sentences sampled as queries")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    corpus = load_corpus(args.paths)
+    if not corpus:
+        parser.error("no supported documents found")
+    probes = sample_probes(corpus, args.probes)
+    characters = sum(len(text) for _, pages in corpus for _, text in pages)
+    print(f"{len(corpus)} documents, {characters} characters, {len(probes)} probes\n")
+
+    header = f"{'strategy':<10} {'chunks':>7} {'mean len':>9} {'max len':>8} {'time (s)':>9} {'intact':>7} {f'hit@{args.k}':>7}"
+    print(header)
+    print("-" * len(header))
+    for strategy in ["legacy", *CHUNKERS]:
+        result = evaluate(strategy, corpus, probes, args.k)
+        print(
+            f"{strategy:<10} {result['chunks']:>7} {result['mean_len']:>9.0f} "
+            f"{result['max_len']:>8} {result['seconds']:>9.3f} "
+            f"{result['intact']:>7.1%} {result[f'hit@{args.k}']:>7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
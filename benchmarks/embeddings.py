@@ -0,0 +1,163 @@
+"""Compare embedding backends on a document corpus.
+
+For every backend in embedding_backends.EMBEDDING_BACKENDS (or those given
+with --backends), embeds the chunks of the corpus and reports the document
+throughput, the latency of embedding single queries, and retrieval quality.
+Quality is estimated with sentence probes: a sentence is sampled from a
+chunk, a query is made from it by dropping some of its words, and a probe
+is a hit when a chunk containing the sentence is among the top-k chunks by
+cosine similarity. MRR is the mean reciprocal rank of the first such chunk.
+The embedding cache is bypassed, so remote backends use API quota for
+every chunk and query. Run from the repository root:
+
+    python benchmarks/embeddings.py manuals/ --max-chunks 1000 --probes 200
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import SENTENCE_END  # noqa: E402
+from document_processor import FILE_TYPES, process_path  # noqa: E402
+from embedding_backends import EMBEDDING_BACKENDS, create_embedding_function  # noqa: E402
+from ingestion import EMBEDDING_BATCH_SIZE  # noqa: E402
+from knowledge_base import KnowledgeBaseConfig  # noqa: E402
+
+
+def load_chunks(paths):
+    """Return the chunk texts of the supported files under ``paths``."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in sorted(names))
+        else:
+            files.append(path)
+
+    chunks = []
+    for path in files:
+        if os.path.splitext(path)[1].lower() in FILE_TYPES:
+            chunks.extend(document["text"] for document in process_path(path))
+    return chunks
+
+
+def normalize(text):
+    return " ".join(text.split())
+
+
+def sample_probes(chunks, n, min_words=8, drop=0.3):
+    """Sample (sentence, query) pairs; queries miss ``drop`` of the sentence's words."""
+    sentences = set()
+    for chunk in chunks:
+        text = normalize(chunk)
+        start = 0
+        for match in SENTENCE_END.finditer(text + " "):
+            sentence = text[start:match.end()].strip()
+            start = match.end()
+            if len(sentence.split()) >= min_words:
+                sentences.add(sentence)
+
+    probes = []
+    for sentence in random.sample(sorted(sentences), min(n, len(sentences))):
+        words = sentence.split()
+        kept = [w for w in words if random.random() >= drop] or words
+        probes.append((sentence, " ".join(kept)))
+    return probes
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+def evaluate(backend, config, chunks, probes, k):
+    embedding_function = create_embedding_function(backend, config)
+
+    # Warm up, e.g. to load a local model, outside the measurements
+    embedding_function.embed_query(["warm up"])
+
+    start = time.perf_counter()
+    vectors = []
+    for i in range(0, len(chunks), EMBEDDING_BATCH_SIZE):
+        vectors.extend(embedding_function(chunks[i:i + EMBEDDING_BATCH_SIZE]))
+    elapsed = time.perf_counter() - start
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+    normalized = [normalize(chunk) for chunk in chunks]
+
+    latencies = []
+    hits = 0
+    reciprocal_ranks = 0.0
+    for sentence, query in probes:
+        start = time.perf_counter()
+        vector = np.asarray(embedding_function.embed_query([query])[0], dtype=np.float32)
+        latencies.append(time.perf_counter() - start)
+
+        similarities = matrix @ (vector / max(np.linalg.norm(vector), 1e-12))
+        ranked = np.argsort(-similarities)[:k]
+        for rank, i in enumerate(ranked, start=1):
+            if sentence in normalized[i]:
+                hits += 1
+                reciprocal_ranks += 1 / rank
+                break
+
+    return {
+        "backend": backend,
+        "dim": matrix.shape[1],
+        "chunks_per_s": len(chunks) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        f"hit@{k}": hits / max(1, len(probes)),
+        "mrr": reciprocal_ranks / max(1, len(probes)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="Documents or directories of documents")
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(EMBEDDING_BACKENDS), default=list(EMBEDDING_BACKENDS)
+    )
+    parser.add_argument("--max-chunks", type=int, default=2000, help="Chunks sampled from the corpus")
+    parser.add_argument("--probes", type=int, default=200, help="Sentences sampled as queries")
+    parser.add_argument("-k", type=int, default=5, help="Chunks retrieved per query")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    chunks = load_chunks(args.paths)
+    if not chunks:
+        parser.error("no supported documents found")
+    if len(chunks) > args.max_chunks:
+        chunks = random.sample(chunks, args.max_chunks)
+    probes = sample_probes(chunks, args.probes)
+    print(f"{len(chunks)} chunks, {len(probes)} probes\n")
+
+    config = KnowledgeBaseConfig.from_environment()
+    header = (
+        f"{'backend':<10} {'dim':>5} {'chunks/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+        f"{f'hit@{args.k}':>7} {'mrr':>6}"
+    )
+    print(header)
+    print("-" * len(header))
+    for backend in args.backends:
+        try:
+            result = evaluate(backend, config, chunks, probes, args.k)
+        except (ImportError, ValueError) as e:
+            print(f"{backend:<10} skipped: {e}")
+            continue
+        print(
+            f"{backend:<10} {result['dim']:>5} {result['chunks_per_s']:>9.1f} "
+            f"{result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+            f"{result[f'hit@{args.k}']:>7.1%} {result['mrr']:>6.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
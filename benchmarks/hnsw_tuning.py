@@ -0,0 +1,179 @@
+"""Tune the HNSW index parameters of a collection offline.
+
+Reads the embeddings of a collection and embeds a sample of real queries:
+user messages from the chat history, or the lines of a --queries file.
+Then, for every M (max_neighbors) and ef_construction in the sweep, builds
+an in-memory index over the embeddings in the collection's distance space,
+and for every ef_search reports recall@k against brute-force search,
+p50/p99 query latency, and the index memory estimated from hnswlib's
+layout. The collection itself is not changed; apply a result with an index
+profile (index_profiles.py) when creating a collection, or with
+KnowledgeBase.set_search_ef. Run from the repository root:
+
+    python benchmarks/hnsw_tuning.py --collection first_aid --m 8 16 32 --ef-search 10 50 100
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import chromadb  # noqa: E402
+
+from chat_db import DB_PATH  # noqa: E402
+from index_profiles import collection_space  # noqa: E402
+from knowledge_base import KnowledgeBase, KnowledgeBaseConfig  # noqa: E402
+from paging import iter_collection  # noqa: E402
+
+
+def load_queries(path, sample):
+    """Sample query texts from a file (one per line) or from the chat history."""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+    else:
+        if not os.path.exists(DB_PATH):
+            return []
+        conn = sqlite3.connect(DB_PATH)
+        try:
+            queries = [
+                row[0]
+                for row in conn.execute(
+                    "SELECT DISTINCT content FROM messages WHERE role = 'user' AND content != ''"
+                )
+            ]
+        finally:
+            conn.close()
+    return random.sample(queries, min(sample, len(queries)))
+
+
+def brute_force(vectors, queries, space, k):
+    """Exact top-k row indices of ``vectors`` for each query."""
+    if space == "cosine":
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+    if space == "l2":
+        distances = (
+            (queries ** 2).sum(axis=1)[:, None]
+            - 2 * queries @ vectors.T
+            + (vectors ** 2).sum(axis=1)[None, :]
+        )
+    else:
+        distances = -(queries @ vectors.T)
+    return np.argsort(distances, axis=1)[:, :k]
+
+
+def index_memory(n, dim, m):
+    """Bytes of an hnswlib index: vectors and level-0 links, plus upper-level links."""
+    level0 = n * (4 * dim + 2 * m * 4 + 4 + 8)
+    upper = n * 4 + n / max(1, m - 1) * (m * 4 + 4)
+    return level0 + upper
+
+
+def sweep(client, vectors, queries, exact, space, m, ef_construction, ef_values, k):
+    collection = client.create_collection(
+        name=f"tuning_{m}_{ef_construction}",
+        configuration={
+            "hnsw": {"space": space, "max_neighbors": m, "ef_construction": ef_construction}
+        },
+        embedding_function=None,
+    )
+    try:
+        ids = [str(i) for i in range(len(vectors))]
+        batch = client.get_max_batch_size()
+        start = time.perf_counter()
+        for i in range(0, len(ids), batch):
+            collection.add(ids=ids[i:i + batch], embeddings=vectors[i:i + batch])
+        build_seconds = time.perf_counter() - start
+
+        results = []
+        for ef_search in ef_values:
+            collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+            latencies = []
+            recall = 0.0
+            for query, expected in zip(queries, exact):
+                start = time.perf_counter()
+                found = collection.query(query_embeddings=[query], n_results=k, include=[])
+                latencies.append(time.perf_counter() - start)
+                recall += len({int(i) for i in found["ids"][0]} & set(expected.tolist())) / k
+            results.append({
+                "m": m,
+                "ef_construction": ef_construction,
+                "ef_search": ef_search,
+                "build_s": build_seconds,
+                "recall": recall / len(queries),
+                "p50_ms": np.percentile(latencies, 50) * 1000,
+                "p99_ms": np.percentile(latencies, 99) * 1000,
+                "memory_mb": index_memory(len(vectors), vectors.shape[1], m) / 2**20,
+            })
+        return results
+    finally:
+        client.delete_collection(collection.name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("-c", "--collection", required=True, help="Collection to tune")
+    parser.add_argument("--queries", help="File with one query per line (default: chat history)")
+    parser.add_argument("--sample", type=int, default=200, help="Queries sampled")
+    parser.add_argument("-k", type=int, default=10, help="Results per query")
+    parser.add_argument("--m", type=int, nargs="+", default=[8, 16, 32])
+    parser.add_argument("--ef-construction", type=int, nargs="+", default=[100, 200])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    knowledge_base = KnowledgeBase(KnowledgeBaseConfig.from_environment())
+    collection = knowledge_base.get_collection(args.collection)
+    if collection is None:
+        parser.error(f"collection {args.collection} does not exist")
+    space = collection_space(collection)
+
+    pages = [
+        np.asarray(page["embeddings"], dtype=np.float32)
+        for page in iter_collection(collection, ["embeddings"])
+    ]
+    if sum(len(page) for page in pages) <= args.k:
+        parser.error(f"collection {args.collection} has too few chunks")
+    vectors = np.vstack(pages)
+
+    texts = load_queries(args.queries, args.sample)
+    if not texts:
+        parser.error("no queries found; pass a --queries file")
+    embedding_function = knowledge_base.collection_embedding_function(collection)
+    queries = np.asarray(embedding_function.embed_query(texts), dtype=np.float32)
+
+    exact = brute_force(vectors, queries, space, args.k)
+    print(
+        f"{len(vectors)} chunks of dimension {vectors.shape[1]}, {len(queries)} queries, "
+        f"space {space}, k={args.k}\n"
+    )
+
+    header = (
+        f"{'M':>4} {'ef_c':>5} {'ef_s':>5} {'build s':>8} {f'recall@{args.k}':>10} "
+        f"{'p50 ms':>7} {'p99 ms':>7} {'mem MB':>7}"
+    )
+    print(header)
+    print("-" * len(header))
+    client = chromadb.EphemeralClient()
+    for m in args.m:
+        for ef_construction in args.ef_construction:
+            for result in sweep(
+                client, vectors, queries, exact, space, m, ef_construction, args.ef_search, args.k
+            ):
+                print(
+                    f"{result['m']:>4} {result['ef_construction']:>5} {result['ef_search']:>5} "
+                    f"{result['build_s']:>8.2f} {result['recall']:>10.1%} "
+                    f"{result['p50_ms']:>7.2f} {result['p99_ms']:>7.2f} {result['memory_mb']:>7.1f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
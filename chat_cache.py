@@ -0,0 +1,108 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Defaults for the process-wide cache of live Gemini chat objects
+CHAT_CACHE_MAX_ENTRIES = 256
+CHAT_CACHE_TTL_SECONDS = 30 * 60
+CHAT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+class ChatCache:
+    """Thread-safe LRU cache of live chat objects keyed by chat id.
+
+    Entries expire ``ttl`` seconds after they were stored. Besides the entry
+    limit, the cache keeps the estimated size of the cached histories under
+    ``max_bytes``, evicting least recently used chats first.
+    """
+
+    def __init__(
+        self,
+        max_entries=CHAT_CACHE_MAX_ENTRIES,
+        ttl=CHAT_CACHE_TTL_SECONDS,
+        max_bytes=CHAT_CACHE_MAX_BYTES,
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # chat_id -> (chat, size, expires_at)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, chat_id):
+        """Return the cached chat for ``chat_id`` or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(chat_id)
+            if entry is None:
+                return None
+            chat, _, expires_at = entry
+            if expires_at <= time.monotonic():
+                self._remove(chat_id)
+                return None
+            self._entries.move_to_end(chat_id)
+            return chat
+
+    def put(self, chat_id, chat, size=0):
+        """Cache ``chat`` under ``chat_id``; ``size`` is its estimated footprint in bytes."""
+        with self._lock:
+            if chat_id in self._entries:
+                self._remove(chat_id)
+            # A single chat larger than the whole budget is not worth caching
+            if size > self.max_bytes:
+                return
+            self._entries[chat_id] = (chat, size, time.monotonic() + self.ttl)
+            self._total_bytes += size
+            while (
+                len(self._entries) > self.max_entries
+                or self._total_bytes > self.max_bytes
+            ):
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, chat_id):
+        """Drop the cached chat for ``chat_id`` if present."""
+        with self._lock:
+            if chat_id in self._entries:
+                self._remove(chat_id)
+
+    def clear(self):
+        """Drop all cached chats."""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _remove(self, chat_id):
+        _, size, _ = self._entries.pop(chat_id)
+        self._total_bytes -= size
+
+
+_chat_cache = ChatCache()
+
+
+def estimate_history_size(history):
+    """Estimate the in-memory footprint of a serialized Gemini history."""
+    if not history:
+        return 0
+    return sum(
+        len(part["text"] or "") for content in history for part in content["parts"]
+    )
+
+
+def get_cached_chat(chat_id):
+    """Get the live chat object cached for a chat session, if any."""
+    return _chat_cache.get(chat_id)
+
+
+def cache_chat(chat_id, chat, history=None):
+    """Cache a live chat object built from ``history`` for a chat session."""
+    _chat_cache.put(chat_id, chat, estimate_history_size(history))
+
+
+def invalidate_chat(chat_id):
+    """Forget the cached chat object for a chat session."""
+    _chat_cache.invalidate(chat_id)
+
+
+def clear_chat_cache():
+    """Forget all cached chat objects."""
+    _chat_cache.clear()
@@ -1,25 +1,103 @@
 import sqlite3
+import hashlib
 import json
+import queue
+from contextlib import contextmanager
 from datetime import datetime
 import os
 import streamlit as st
+from chat_cache import invalidate_chat, clear_chat_cache
 
 
-def get_db_connection():
-    """Create a connection to the SQLite database."""
-    # Ensure the data directory exists
-    os.makedirs("data", exist_ok=True)
+DB_DIR = "data"
+DB_PATH = os.path.join(DB_DIR, "chats.db")
 
-    conn = sqlite3.connect("data/chats.db")
-    conn.row_factory = sqlite3.Row
-    return conn
+# Upper bound on idle connections kept per process. Extra connections are
+# opened on demand under load and closed when returned to a full pool.
+POOL_SIZE = 8
 
+# Number of decoded images kept in memory by get_image
+IMAGE_CACHE_ENTRIES = 128
 
-def init_db():
-    """Initialize the database with required tables."""
-    conn = get_db_connection()
-    c = conn.cursor()
+# SQLite limits the number of bound parameters per statement
+_MAX_PARAMS = 500
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived SQLite connections.
+
+    Streamlit runs every browser session in its own thread, so connections
+    are opened with ``check_same_thread=False`` and handed to one thread at
+    a time through a queue.
+    """
 
+    def __init__(self, path, size=POOL_SIZE):
+        self.path = path
+        self._idle = queue.LifoQueue(maxsize=size)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers proceed while a writer holds the lock
+        conn.execute("PRAGMA journal_mode=WAL")
+        # NORMAL is durable across application crashes in WAL mode
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Negative value is in KiB: ~16 MB page cache per connection
+        conn.execute("PRAGMA cache_size=-16000")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def acquire(self):
+        """Take an idle connection, opening a new one if none is available."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connect()
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full."""
+        try:
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+
+
+@st.cache_resource
+def get_connection_pool():
+    """Get the process-wide connection pool, creating the database on first use."""
+    os.makedirs(DB_DIR, exist_ok=True)
+    pool = ConnectionPool(DB_PATH)
+
+    conn = pool.acquire()
+    try:
+        run_migrations(conn)
+    finally:
+        pool.release(conn)
+
+    return pool
+
+
+@contextmanager
+def get_db_connection():
+    """Borrow a pooled connection to the SQLite database.
+
+    Commits when the block exits normally and rolls back on error.
+    """
+    pool = get_connection_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        pool.release(conn)
+
+
+def _create_base_tables(c):
+    """Migration 1: the original chat tables."""
     # Create table for chat sessions
     c.execute(
         """
@@ -58,169 +136,435 @@ def init_db():
     """
     )
 
-    conn.commit()
-    conn.close()
 
+def _add_indexes(c):
+    """Migration 2: indexes for the per-session and recency lookups."""
+    # get_messages filters by session and orders by timestamp
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_session_timestamp "
+        "ON messages (session_id, timestamp)"
+    )
 
-def create_new_chat():
-    """Create a new chat session and return its ID."""
-    conn = get_db_connection()
-    c = conn.cursor()
-
-    now = datetime.now().isoformat()
-    title = "New Chat"  # Changed from timestamp to "New Chat"
+    # get_chat_sessions lists the most recently updated chats first
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_chat_sessions_updated_at "
+        "ON chat_sessions (updated_at)"
+    )
 
+    # Keep only the newest history row per session before making it unique
     c.execute(
-        "INSERT INTO chat_sessions (title, created_at, updated_at) VALUES (?, ?, ?)",
-        (title, now, now),
+        """
+    DELETE FROM gemini_history
+    WHERE rowid NOT IN (
+        SELECT MAX(rowid) FROM gemini_history GROUP BY session_id
+    )
+    """
+    )
+    c.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_gemini_history_session "
+        "ON gemini_history (session_id)"
     )
 
-    session_id = c.lastrowid
-    conn.commit()
-    conn.close()
 
-    return session_id
+def _store_image(c, data, now):
+    """Insert image bytes keyed by SHA-256 (no-op if already stored) and return the key."""
+    image_id = hashlib.sha256(data).hexdigest()
+    c.execute(
+        "INSERT OR IGNORE INTO images (id, data, size, created_at) VALUES (?, ?, ?, ?)",
+        (image_id, data, len(data), now),
+    )
+    return image_id
 
 
-def update_chat_title(session_id, title):
-    """Update the title of a chat session."""
-    conn = get_db_connection()
-    c = conn.cursor()
+def _move_images_to_side_table(c):
+    """Migration 3: content-addressed image storage.
 
-    now = datetime.now().isoformat()
+    Images used to be stored hex-encoded in a JSON list in messages.images.
+    They now live once per SHA-256 in ``images`` and messages reference them
+    through ``message_images``. Existing rows are converted and the old
+    column is cleared.
+    """
+    c.execute(
+        """
+    CREATE TABLE IF NOT EXISTS images (
+        id TEXT PRIMARY KEY,
+        data BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        created_at TEXT NOT NULL
+    )
+    """
+    )
+    c.execute(
+        """
+    CREATE TABLE IF NOT EXISTS message_images (
+        message_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        image_id TEXT NOT NULL,
+        PRIMARY KEY (message_id, position),
+        FOREIGN KEY (message_id) REFERENCES messages (id) ON DELETE CASCADE,
+        FOREIGN KEY (image_id) REFERENCES images (id)
+    )
+    """
+    )
+    # Used when collecting images no message refers to any more
+    c.execute(
+        "CREATE INDEX IF NOT EXISTS idx_message_images_image ON message_images (image_id)"
+    )
 
+    now = datetime.now().isoformat()
+    rows = c.execute(
+        "SELECT id, images FROM messages WHERE images IS NOT NULL"
+    ).fetchall()
+    for message_id, img_data in rows:
+        for position, img_hex in enumerate(json.loads(img_data)):
+            image_id = _store_image(c, bytes.fromhex(img_hex), now)
+            c.execute(
+                "INSERT OR IGNORE INTO message_images (message_id, position, image_id) VALUES (?, ?, ?)",
+                (message_id, position, image_id),
+            )
+    c.execute("UPDATE messages SET images = NULL WHERE images IS NOT NULL")
+
+
+def _split_gemini_history_into_turns(c):
+    """Migration 4: append-only Gemini history.
+
+    gemini_history held the whole serialized conversation in one row that
+    was rewritten after every turn. Each content entry now gets its own row
+    in ``gemini_turns`` so saving a turn only writes the new entries.
+    """
     c.execute(
-        "UPDATE chat_sessions SET title = ?, updated_at = ? WHERE id = ?",
-        (title, now, session_id),
+        """
+    CREATE TABLE IF NOT EXISTS gemini_turns (
+        session_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        role TEXT NOT NULL,
+        parts TEXT NOT NULL,
+        PRIMARY KEY (session_id, position),
+        FOREIGN KEY (session_id) REFERENCES chat_sessions (id) ON DELETE CASCADE
+    )
+    """
     )
 
-    conn.commit()
-    conn.close()
+    # History of deleted chats is dropped: it would violate the foreign key.
+    # Databases that already applied this step had none.
+    rows = c.execute(
+        "SELECT session_id, history_data FROM gemini_history "
+        "WHERE session_id IN (SELECT id FROM chat_sessions)"
+    ).fetchall()
+    for session_id, history_data in rows:
+        c.executemany(
+            "INSERT OR IGNORE INTO gemini_turns (session_id, position, role, parts) VALUES (?, ?, ?, ?)",
+            [
+                (session_id, position, content["role"], json.dumps(content["parts"]))
+                for position, content in enumerate(json.loads(history_data))
+            ],
+        )
+    c.execute("DROP TABLE gemini_history")
+
+
+# Ordered schema migrations. The database records how many have been applied
+# in PRAGMA user_version; append new steps here, never edit applied ones.
+MIGRATIONS = [
+    _create_base_tables,
+    _add_indexes,
+    _move_images_to_side_table,
+    _split_gemini_history_into_turns,
+]
+
+
+def _delete_orphaned_rows(c):
+    """Delete rows of chats that no longer exist.
+
+    Chats used to be deleted with foreign keys off, so their messages and
+    Gemini history were left behind. Connections now enforce foreign keys,
+    and migrations copying such rows would fail on them.
+    """
+    tables = {
+        row[0] for row in c.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+    }
+    if "chat_sessions" not in tables:
+        # A new database
+        return
+    for table in ("messages", "gemini_history", "gemini_turns"):
+        if table in tables:
+            # Deleting messages cascades to their message_images rows
+            c.execute(
+                f"DELETE FROM {table} WHERE session_id NOT IN (SELECT id FROM chat_sessions)"
+            )
+
+
+def get_schema_version(conn):
+    """Return the number of migrations applied to the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def run_migrations(conn, target=None):
+    """Apply pending schema migrations up to ``target`` (default: all).
+
+    Each migration runs in its own write transaction together with the
+    version bump, so an interrupted upgrade resumes where it stopped.
+    Before the first pending migration, rows of deleted chats are removed
+    (see _delete_orphaned_rows); this is not a numbered migration because
+    databases at any version, including unversioned ones created before
+    migrations, may hold them.
+    """
+    if target is None:
+        target = len(MIGRATIONS)
+
+    if get_schema_version(conn) < target:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            _delete_orphaned_rows(conn.cursor())
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+    while get_schema_version(conn) < target:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we waited for the lock
+            version = get_schema_version(conn)
+            if version >= target:
+                conn.rollback()
+                break
+            MIGRATIONS[version](conn.cursor())
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
 
 
-def get_chat_sessions():
-    """Retrieve all chat sessions."""
-    conn = get_db_connection()
-    c = conn.cursor()
+def init_db():
+    """Initialize the database and apply any pending schema migrations.
 
-    c.execute(
-        "SELECT id, title, created_at FROM chat_sessions ORDER BY updated_at DESC"
-    )
-    sessions = [dict(row) for row in c.fetchall()]
+    Directory setup and migrations run once per process when the connection
+    pool is created, so calling this on every rerun is cheap.
+    """
+    get_connection_pool()
 
-    conn.close()
-    return sessions
 
+def create_new_chat():
+    """Create a new chat session and return its ID."""
+    now = datetime.now().isoformat()
+    title = "New Chat"  # Changed from timestamp to "New Chat"
 
-def save_message(session_id, role, content, images=None):
-    """Save a message to the database."""
-    conn = get_db_connection()
-    c = conn.cursor()
+    with get_db_connection() as conn:
+        c = conn.execute(
+            "INSERT INTO chat_sessions (title, created_at, updated_at) VALUES (?, ?, ?)",
+            (title, now, now),
+        )
+        session_id = c.lastrowid
 
-    now = datetime.now().isoformat()
+    return session_id
 
-    # Convert images to JSON string if present
-    img_data = None
-    if images:
-        img_data = json.dumps([img.hex() for img in images])
 
-    c.execute(
-        "INSERT INTO messages (session_id, role, content, images, timestamp) VALUES (?, ?, ?, ?, ?)",
-        (session_id, role, content, img_data, now),
-    )
+def update_chat_title(session_id, title):
+    """Update the title of a chat session."""
+    now = datetime.now().isoformat()
 
-    # Update the chat session's updated_at timestamp
-    c.execute("UPDATE chat_sessions SET updated_at = ? WHERE id = ?", (now, session_id))
+    with get_db_connection() as conn:
+        conn.execute(
+            "UPDATE chat_sessions SET title = ?, updated_at = ? WHERE id = ?",
+            (title, now, session_id),
+        )
 
-    conn.commit()
-    conn.close()
 
+def get_chat_sessions():
+    """Retrieve all chat sessions."""
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            "SELECT id, title, created_at FROM chat_sessions ORDER BY updated_at DESC"
+        ).fetchall()
 
-def get_messages(session_id):
-    """Retrieve all messages for a chat session."""
-    conn = get_db_connection()
-    c = conn.cursor()
+    return [dict(row) for row in rows]
 
-    c.execute(
-        "SELECT role, content, images FROM messages WHERE session_id = ? ORDER BY timestamp",
-        (session_id,),
-    )
-    messages = []
 
-    for row in c.fetchall():
-        message = {"role": row["role"], "content": row["content"]}
-        if row["images"]:
-            # Convert from JSON string back to list of bytes
-            images = [bytes.fromhex(img) for img in json.loads(row["images"])]
-            message["images"] = images
-        else:
-            message["images"] = []
-        messages.append(message)
+def save_message(session_id, role, content, images=None):
+    """Save a message to the database.
 
-    conn.close()
-    return messages
+    Returns:
+        List of image ids (SHA-256 hex digests) for the stored images, which
+        can be passed to get_image.
+    """
+    now = datetime.now().isoformat()
 
+    image_ids = []
+    with get_db_connection() as conn:
+        c = conn.execute(
+            "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, ?, ?, ?)",
+            (session_id, role, content, now),
+        )
+        message_id = c.lastrowid
+
+        # Identical images are stored once and shared between messages
+        for position, img in enumerate(images or []):
+            image_id = _store_image(conn, img, now)
+            conn.execute(
+                "INSERT INTO message_images (message_id, position, image_id) VALUES (?, ?, ?)",
+                (message_id, position, image_id),
+            )
+            image_ids.append(image_id)
+
+        # Update the chat session's updated_at timestamp
+        conn.execute(
+            "UPDATE chat_sessions SET updated_at = ? WHERE id = ?", (now, session_id)
+        )
+
+    return image_ids
+
+
+def _get_image_ids(conn, message_ids):
+    """Map each message id to its ordered list of image ids."""
+    image_ids = {}
+    for i in range(0, len(message_ids), _MAX_PARAMS):
+        batch = message_ids[i:i + _MAX_PARAMS]
+        placeholders = ", ".join("?" * len(batch))
+        rows = conn.execute(
+            f"SELECT message_id, image_id FROM message_images "
+            f"WHERE message_id IN ({placeholders}) ORDER BY message_id, position",
+            batch,
+        ).fetchall()
+        for row in rows:
+            image_ids.setdefault(row["message_id"], []).append(row["image_id"])
+    return image_ids
+
+
+def get_messages(session_id, before=None, limit=None):
+    """Retrieve messages for a chat session in chronological order.
+
+    Pages are read newest-first with keyset pagination on the
+    (session_id, timestamp) index, so loading a page costs the same no
+    matter how long the chat is.
+
+    Args:
+        session_id: Chat session to read.
+        before: Id of a message; only messages older than it are returned.
+        limit: Maximum number of (most recent) messages to return. If None,
+            all matching messages are returned.
+
+    Returns:
+        List of message dicts with ``id``, ``role``, ``content`` and
+        ``images``. Images are returned as ids rather than bytes; load them
+        with get_image when they are displayed.
+    """
+    query = "SELECT id, role, content FROM messages WHERE session_id = ?"
+    params = [session_id]
+
+    if before is not None:
+        query += " AND (timestamp, id) < (SELECT timestamp, id FROM messages WHERE id = ?)"
+        params.append(before)
+
+    query += " ORDER BY timestamp DESC, id DESC"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    with get_db_connection() as conn:
+        rows = conn.execute(query, params).fetchall()
+        rows.reverse()
+        image_ids = _get_image_ids(conn, [row["id"] for row in rows])
+
+    return [
+        {
+            "id": row["id"],
+            "role": row["role"],
+            "content": row["content"],
+            "images": image_ids.get(row["id"], []),
+        }
+        for row in rows
+    ]
+
+
+def has_earlier_messages(session_id, before):
+    """Check whether a chat session has messages older than message ``before``."""
+    with get_db_connection() as conn:
+        row = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM messages WHERE session_id = ? "
+            "AND (timestamp, id) < (SELECT timestamp, id FROM messages WHERE id = ?))",
+            (session_id, before),
+        ).fetchone()
+
+    return bool(row[0])
+
+
+@st.cache_data(max_entries=IMAGE_CACHE_ENTRIES, show_spinner=False)
+def get_image(image_id):
+    """Load the bytes of a stored image.
+
+    Images are content-addressed and never change, so results are cached.
+    """
+    with get_db_connection() as conn:
+        row = conn.execute("SELECT data FROM images WHERE id = ?", (image_id,)).fetchone()
 
-def save_gemini_history(session_id, history_data):
-    """Save Gemini chat history for a session."""
-    conn = get_db_connection()
-    c = conn.cursor()
+    return bytes(row["data"]) if row else None
 
-    # Convert Content objects to serializable form
-    serializable_history = []
-    for content in history_data:
-        parts_data = []
-        for part in content.parts:
-            part_data = {"text": part.text if part.text else None}
-            parts_data.append(part_data)
 
-        serializable_history.append({"role": content.role, "parts": parts_data})
+def _delete_unreferenced_images(conn):
+    """Remove images that no message refers to any more."""
+    conn.execute(
+        "DELETE FROM images WHERE id NOT IN (SELECT image_id FROM message_images)"
+    )
 
-    history_json = json.dumps(serializable_history)
 
-    # Delete any existing history for this session
-    c.execute("DELETE FROM gemini_history WHERE session_id = ?", (session_id,))
+def save_gemini_history(session_id, history_data):
+    """Save Gemini chat history for a session.
 
-    # Insert the new history
-    c.execute(
-        "INSERT INTO gemini_history (session_id, history_data) VALUES (?, ?)",
-        (session_id, history_json),
-    )
+    History only ever grows, so only the entries past those already stored
+    are written.
+    """
+    with get_db_connection() as conn:
+        stored = conn.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM gemini_turns WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()[0]
 
-    conn.commit()
-    conn.close()
+        # Convert the new Content objects to serializable form
+        new_turns = []
+        for position, content in enumerate(history_data[stored:], start=stored):
+            parts_data = []
+            for part in content.parts:
+                part_data = {"text": part.text if part.text else None}
+                parts_data.append(part_data)
 
+            new_turns.append((session_id, position, content.role, json.dumps(parts_data)))
 
-def get_gemini_history(session_id):
-    """Retrieve Gemini chat history for a session."""
-    conn = get_db_connection()
-    c = conn.cursor()
+        conn.executemany(
+            "INSERT INTO gemini_turns (session_id, position, role, parts) VALUES (?, ?, ?, ?)",
+            new_turns,
+        )
 
-    c.execute(
-        "SELECT history_data FROM gemini_history WHERE session_id = ?", (session_id,)
-    )
-    row = c.fetchone()
+    # Cached chat objects were built from the previous history
+    invalidate_chat(session_id)
 
-    conn.close()
 
-    if row:
-        return json.loads(row["history_data"])
+def get_gemini_history(session_id):
+    """Retrieve Gemini chat history for a session."""
+    with get_db_connection() as conn:
+        rows = conn.execute(
+            "SELECT role, parts FROM gemini_turns WHERE session_id = ? ORDER BY position",
+            (session_id,),
+        ).fetchall()
+
+    if rows:
+        return [{"role": row["role"], "parts": json.loads(row["parts"])} for row in rows]
     return None
 
 
 def delete_chat_session(chat_id):
     """Delete a specific chat session and all its messages"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM chat_sessions WHERE id = ?", (chat_id,))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM chat_sessions WHERE id = ?", (chat_id,))
+        _delete_unreferenced_images(conn)
+
+    invalidate_chat(chat_id)
 
 
 def delete_all_chat_sessions():
     """Delete all chat sessions and messages"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM chat_sessions")
-    conn.commit()
-    conn.close()
\ No newline at end of file
+    with get_db_connection() as conn:
+        conn.execute("DELETE FROM chat_sessions")
+        _delete_unreferenced_images(conn)
+
+    clear_chat_cache()
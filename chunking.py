@@ -0,0 +1,313 @@
+import re
+import unicodedata
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+
+# Defaults of the character-based strategies
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+
+# Defaults of the token strategy, in whitespace-delimited tokens
+TOKEN_CHUNK_SIZE = 200
+TOKEN_CHUNK_OVERLAP = 20
+
+DEFAULT_STRATEGY = "recursive"
+
+# Characters searched back from the window end for a cut outside a cluster
+MAX_CLUSTER_LENGTH = 8
+
+# Sentence ends, including the Devanagari danda and double danda, with any
+# closing quotes or brackets
+SENTENCE_END = re.compile(r"[.!?।॥]+[\"'”’)\]]*(?=\s)")
+WHITESPACE = re.compile(r"\s+")
+NON_SPACE = re.compile(r"\S+")
+_FIRST_NON_SPACE = re.compile(r"\S")
+
+
+def _is_joiner(ch):
+    """True for characters that continue the previous one (combining marks, ZWJ/ZWNJ)."""
+    return unicodedata.category(ch) in ("Mn", "Mc", "Me") or ch in "\u200c\u200d"
+
+
+def _skip_space(text, pos, end):
+    """Return the first non-whitespace offset in text[pos:end] (or end)."""
+    # Match a single character: \S+ would scan to the end of a long word
+    match = _FIRST_NON_SPACE.search(text, pos, end)
+    return match.start() if match else end
+
+
+def _rstrip(text, start, end):
+    """Move ``end`` back over trailing whitespace, not before ``start``."""
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+def _last_separator(text, separator, lo, hi):
+    """Return the offset just after the last ``separator`` in text[lo:hi], or -1.
+
+    ``separator`` is a string or a compiled pattern; patterns may look at
+    the character at ``hi``.
+    """
+    if isinstance(separator, str):
+        found = text.rfind(separator, lo, hi)
+        return found + len(separator) if found != -1 else -1
+    cut = -1
+    for match in separator.finditer(text, lo, min(hi + 1, len(text))):
+        if match.end() <= hi:
+            cut = match.end()
+    return cut
+
+
+class Chunker:
+    """Splits text into overlapping chunks, left to right.
+
+    Subclasses implement ``next_span``, which only looks at a bounded
+    window after ``start``; chunks are therefore found in linear time and
+    can be produced while the text is still being read (see iter_chunks).
+    Spans are offsets into the text, which is sliced once per chunk.
+    """
+
+    name = None
+
+    def next_span(self, text: str, start: int, final: bool) -> Optional[Tuple[int, int]]:
+        """Find the chunk starting at ``start``.
+
+        Args:
+            text: Text read so far
+            start: Offset of the chunk (not whitespace)
+            final: Whether ``text`` is complete
+
+        Returns:
+            Tuple (end, next_start), with next_start None for the last
+            chunk, or None if more text is needed to decide
+        """
+        raise NotImplementedError
+
+    def spans(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield the (start, end) offsets of the chunks of a complete text."""
+        start = _skip_space(text, 0, len(text))
+        while start < len(text):
+            end, next_start = self.next_span(text, start, True)
+            yield start, end
+            if next_start is None:
+                return
+            start = next_start
+
+    def chunk(self, text: str):
+        """Return the chunks of a complete text."""
+        return [text[start:end] for start, end in self.spans(text)]
+
+
+class _CharacterChunker(Chunker):
+    """Character-budget chunker cutting at the best separator in each window.
+
+    Separators are tried in order; the chunk ends after the last occurrence
+    of the first one found at least ``min_size`` characters into the
+    window. Without any, the cut falls on a whitespace or, for very long
+    words, before any combining mark so that aksharas are never split.
+    """
+
+    separators = ()
+
+    def __init__(self, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, min_size=None):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.min_size = chunk_size // 2 if min_size is None else min_size
+
+    def _cut(self, text, start):
+        hi = start + self.chunk_size
+        lo = start + self.min_size
+        for separator in self.separators:
+            cut = _last_separator(text, separator, lo, hi)
+            if cut > start:
+                return cut
+        cut = _last_separator(text, WHITESPACE, start + 1, hi)
+        if cut > start:
+            return cut
+        # Virama (combining class 9) joins the consonants around it. Clusters
+        # are short, so text made only of joined characters is cut at hi.
+        floor = max(start + 1, hi - MAX_CLUSTER_LENGTH)
+        for cut in range(hi, floor - 1, -1):
+            if not (_is_joiner(text[cut]) or unicodedata.combining(text[cut - 1]) == 9):
+                return cut
+        return hi
+
+    def _next_start(self, text, start, cut):
+        """Start the next chunk ``overlap`` characters before the cut, on a word start."""
+        if not self.overlap:
+            return _skip_space(text, cut, len(text))
+        lo = max(start + 1, cut - self.overlap)
+        boundary = WHITESPACE.search(text, lo, cut)
+        if boundary and boundary.end() < cut:
+            return boundary.end()
+        return _skip_space(text, cut, len(text))
+
+    def next_span(self, text, start, final):
+        if len(text) - start <= self.chunk_size:
+            # The window may still grow, unless the text is complete
+            return (_rstrip(text, start, len(text)), None) if final else None
+        cut = self._cut(text, start)
+        if _skip_space(text, cut, len(text)) >= len(text):
+            # Only whitespace follows so far
+            return (_rstrip(text, start, cut), None) if final else None
+        return _rstrip(text, start, cut), self._next_start(text, start, cut)
+
+
+class FixedChunker(_CharacterChunker):
+    """Fixed-size windows cut on word boundaries, without regard for structure."""
+
+    name = "fixed"
+
+
+class RecursiveChunker(_CharacterChunker):
+    """Prefers paragraph breaks, then line breaks, then sentence ends, then words."""
+
+    name = "recursive"
+    separators = ("\n\n", "\n", SENTENCE_END)
+
+
+class SentenceChunker(_CharacterChunker):
+    """Packs whole sentences; overlap repeats the last sentences of a chunk."""
+
+    name = "sentence"
+    separators = (SENTENCE_END, "\n")
+
+    def __init__(self, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, min_size=1):
+        super().__init__(chunk_size, overlap, min_size)
+
+    def _next_start(self, text, start, cut):
+        if self.overlap:
+            # First sentence starting inside the overlap region
+            lo = max(start + 1, cut - self.overlap)
+            match = SENTENCE_END.search(text, lo, cut)
+            if match:
+                next_start = _skip_space(text, match.end(), cut)
+                if next_start < cut:
+                    return next_start
+        return _skip_space(text, cut, len(text))
+
+
+class TokenChunker(Chunker):
+    """Chunks of ``chunk_size`` whitespace-delimited tokens.
+
+    Token counts track the embedding model's input limit more closely than
+    characters for scripts whose characters vary in byte and token length.
+    """
+
+    name = "token"
+
+    def __init__(self, chunk_size=TOKEN_CHUNK_SIZE, overlap=TOKEN_CHUNK_OVERLAP):
+        if not 0 <= overlap < chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def next_span(self, text, start, final):
+        next_start = None
+        for n, match in enumerate(NON_SPACE.finditer(text, start), start=1):
+            if n == self.chunk_size - self.overlap + 1:
+                next_start = match.start()
+            if n == self.chunk_size:
+                rest = _skip_space(text, match.end(), len(text))
+                if rest >= len(text):
+                    # The last token may continue, or be the end of the text
+                    return (match.end(), None) if final else None
+                return match.end(), rest if next_start is None else next_start
+        return (_rstrip(text, start, len(text)), None) if final else None
+
+
+CHUNKERS = {
+    cls.name: cls
+    for cls in (RecursiveChunker, SentenceChunker, TokenChunker, FixedChunker)
+}
+
+
+def get_chunker(strategy: str = None, **options) -> Chunker:
+    """Create the chunker for a strategy name (see CHUNKERS)."""
+    strategy = strategy or DEFAULT_STRATEGY
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    return CHUNKERS[strategy](**options)
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[Optional[int], str]], chunker: Chunker = None
+) -> Iterator[Tuple[str, Optional[int], Optional[int]]]:
+    """Chunk a stream of page texts, including across page boundaries.
+
+    Only the text that is not chunked yet is kept in memory.
+
+    Args:
+        pages: ``(page_number, text)`` pairs in order; page numbers may be None
+        chunker: Chunking strategy (default: DEFAULT_STRATEGY)
+
+    Yields:
+        Tuple (chunk, first_page, last_page) of each chunk
+    """
+    if chunker is None:
+        chunker = get_chunker()
+
+    buffer = ""
+    start = 0  # Offset of the next chunk in the buffer
+    page_starts = []  # (offset in buffer, page_number) of pages still in the buffer
+    done = False
+
+    def pages_of(span_start, span_end):
+        first = last = None
+        for page_offset, page_number in page_starts:
+            if page_offset <= span_start:
+                first = page_number
+            if page_offset < span_end:
+                last = page_number
+        return first, last
+
+    def emit(final):
+        nonlocal start, done
+        while not done:
+            start = _skip_space(buffer, start, len(buffer))
+            if start >= len(buffer):
+                if final:
+                    done = True
+                return
+            span = chunker.next_span(buffer, start, final)
+            if span is None:
+                return
+            end, next_start = span
+            yield (buffer[start:end], *pages_of(start, end))
+            if next_start is None:
+                done = True
+                return
+            start = next_start
+
+    for page_number, text in pages:
+        if not text or done:
+            continue
+        page_starts.append((len(buffer), page_number))
+        buffer += text
+        yield from emit(False)
+
+        # Drop the text before the next chunk
+        if start:
+            buffer = buffer[start:]
+            page_starts = [(page_offset - start, page) for page_offset, page in page_starts]
+            while len(page_starts) > 1 and page_starts[1][0] <= 0:
+                page_starts.pop(0)
+            start = 0
+
+    yield from emit(True)
+
+
+def chunk_stats(chunks) -> Dict[str, float]:
+    """Summarize chunk lengths (count, mean, min and max characters)."""
+    lengths = [len(chunk) for chunk in chunks]
+    if not lengths:
+        return {"count": 0, "mean": 0.0, "min": 0, "max": 0}
+    return {
+        "count": len(lengths),
+        "mean": sum(lengths) / len(lengths),
+        "min": min(lengths),
+        "max": max(lengths),
+    }
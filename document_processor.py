@@ -1,65 +1,199 @@
+import logging
+import mmap
+import multiprocessing
 import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 import fitz  # PyMuPDF
-import streamlit as st
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from chunking import CHUNK_OVERLAP, CHUNK_SIZE, RecursiveChunker, get_chunker, iter_chunks
+
+
+logger = logging.getLogger(__name__)
+
+# Size of the blocks an upload is copied to disk in
+COPY_BLOCK_SIZE = 1024 * 1024
+
+# File types by extension, for files that do not carry a MIME type
+FILE_TYPES = {
+    ".pdf": "application/pdf",
+    ".txt": "text/plain",
+    ".md": "text/markdown",
+    ".csv": "text/csv",
+}
+
+# Processes extracting documents in parallel
+PROCESS_WORKERS = os.cpu_count() or 1
+
+
+def _iter_mapped_pdf_pages(file) -> Iterator[Tuple[int, str]]:
+    """Yield the pages of a PDF stored in a real file, parsed from a memory map."""
+    if os.fstat(file.fileno()).st_size == 0:
+        return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        view = memoryview(mapped)
+        pdf_document = fitz.open(stream=view, filetype="pdf")
+        try:
+            for page_num in range(len(pdf_document)):
+                yield page_num + 1, pdf_document[page_num].get_text()
+        finally:
+            pdf_document.close()
+            view.release()
+
+
+def iter_pdf_pages(pdf_file) -> Iterator[Tuple[int, str]]:
+    """Yield ``(page_number, text)`` for each page of a PDF, starting at 1.
+
+    ``pdf_file`` is a path or a file-like object. Uploads are spooled to a
+    temporary file first; the file is then memory-mapped, so pages are
+    parsed from the mapping instead of an in-memory copy of the whole
+    document, and only one page's text is held at a time.
+    """
+    if isinstance(pdf_file, (str, os.PathLike)):
+        with open(pdf_file, "rb") as f:
+            yield from _iter_mapped_pdf_pages(f)
+        return
+
+    with tempfile.TemporaryFile() as tmp:
+        pdf_file.seek(0)
+        shutil.copyfileobj(pdf_file, tmp, COPY_BLOCK_SIZE)
+        tmp.flush()
+        yield from _iter_mapped_pdf_pages(tmp)
 
 
 def extract_text_from_pdf(pdf_file) -> str:
     """Extract text from a PDF file."""
-    text = ""
     try:
-        # Open the PDF file
-        pdf_document = fitz.open(stream=pdf_file.read(), filetype="pdf")
-        
-        # Iterate through pages
-        for page_num in range(len(pdf_document)):
-            page = pdf_document[page_num]
-            text += page.get_text()
-            
-        pdf_document.close()
-        return text
+        return "".join(text for _, text in iter_pdf_pages(pdf_file))
     except Exception as e:
-        st.error(f"Error extracting text from PDF: {e}")
+        logger.error("Error extracting text from PDF: %s", e)
         return ""
 
 
-def chunk_text(text: str, chunk_size: int = 1000, overlap: int = 100) -> List[str]:
+def chunk_text(text: str, chunk_size: int = CHUNK_SIZE, overlap: int = CHUNK_OVERLAP) -> List[str]:
     """Split text into chunks with overlap."""
-    chunks = []
-    if len(text) <= chunk_size:
-        chunks.append(text)
-    else:
-        for i in range(0, len(text), chunk_size - overlap):
-            chunk = text[i:i + chunk_size]
-            if len(chunk) >= chunk_size // 2:  # Only add if chunk is substantial
-                chunks.append(chunk)
-    return chunks
+    return RecursiveChunker(chunk_size, overlap).chunk(text)
 
 
-def process_document(file, metadata: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-    """Process a document and return chunks with metadata."""
+def _document_chunks(pages, base_metadata, strategy=None) -> Iterator[Dict[str, Any]]:
+    for i, (chunk, first_page, last_page) in enumerate(iter_chunks(pages, get_chunker(strategy))):
+        chunk_metadata = {**base_metadata, "chunk": i}
+        if first_page is not None:
+            chunk_metadata["page"] = first_page
+            chunk_metadata["page_end"] = last_page
+        yield {"text": chunk, "metadata": chunk_metadata}
+
+
+def iter_document_chunks(
+    file, metadata: Dict[str, Any] = None, strategy: str = None
+) -> Iterator[Dict[str, Any]]:
+    """Yield a document's chunks with metadata as they are extracted.
+
+    Chunks of PDFs carry the pages they span in ``page`` and ``page_end``.
+    ``strategy`` names the chunking strategy (see chunking.CHUNKERS).
+    """
     if file.type == "application/pdf":
-        text = extract_text_from_pdf(file)
+        pages = iter_pdf_pages(file)
     elif file.type.startswith("text/"):
-        text = file.getvalue().decode("utf-8")
+        pages = [(None, file.getvalue().decode("utf-8"))]
     else:
-        st.error(f"Unsupported file type: {file.type}")
+        raise ValueError(f"Unsupported file type: {file.type}")
+
+    yield from _document_chunks(pages, metadata or {"source": file.name}, strategy)
+
+
+def process_document(
+    file, metadata: Dict[str, Any] = None, strategy: str = None
+) -> List[Dict[str, Any]]:
+    """Process a document and return chunks with metadata."""
+    try:
+        return list(iter_document_chunks(file, metadata, strategy))
+    except Exception as e:
+        logger.error("Error processing %s: %s", file.name, e)
         return []
-        
-    chunks = chunk_text(text)
-    
-    # Create documents with metadata
-    documents = []
-    base_metadata = metadata or {"source": file.name}
-    
-    for i, chunk in enumerate(chunks):
-        doc = {
-            "text": chunk,
-            "metadata": {
-                **base_metadata,
-                "chunk": i
-            }
+
+
+def process_path(
+    path: str, metadata: Dict[str, Any] = None, strategy: str = None
+) -> List[Dict[str, Any]]:
+    """Process a document on disk and return chunks with metadata.
+
+    The file type is taken from the extension (see FILE_TYPES).
+
+    Raises:
+        ValueError: If the file type is not supported
+    """
+    file_type = FILE_TYPES.get(os.path.splitext(path)[1].lower())
+    if file_type is None:
+        raise ValueError(f"Unsupported file type: {os.path.basename(path)}")
+
+    if file_type == "application/pdf":
+        pages = iter_pdf_pages(path)
+    else:
+        with open(path, encoding="utf-8") as f:
+            pages = [(None, f.read())]
+
+    return list(
+        _document_chunks(pages, metadata or {"source": os.path.basename(path)}, strategy)
+    )
+
+
+def extract_zip(archive, target_dir: str) -> List[Tuple[str, str]]:
+    """Extract the supported documents of a zip archive.
+
+    Args:
+        archive: Path or file-like object of the zip archive
+        target_dir: Directory the documents are written to
+
+    Returns:
+        List of (path, source) with the member path inside the archive as source
+    """
+    extracted = []
+    with zipfile.ZipFile(archive) as zf:
+        for n, info in enumerate(zf.infolist()):
+            name = info.filename
+            if info.is_dir() or os.path.splitext(name)[1].lower() not in FILE_TYPES:
+                continue
+            # Member names are not trusted as paths
+            path = os.path.join(target_dir, f"{n}{os.path.splitext(name)[1].lower()}")
+            with zf.open(info) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BLOCK_SIZE)
+            extracted.append((path, name))
+    return extracted
+
+
+def process_paths(
+    files: List[Tuple[str, str]], max_workers: int = None, strategy: str = None
+) -> Iterator[Tuple[str, Optional[List[Dict[str, Any]]], Optional[Exception]]]:
+    """Extract and chunk many documents in parallel worker processes.
+
+    Args:
+        files: List of (path, source) pairs
+        max_workers: Worker processes (default PROCESS_WORKERS)
+        strategy: Chunking strategy (see chunking.CHUNKERS)
+
+    Yields:
+        Tuple (source, documents, error) for each file as soon as it is
+        processed; exactly one of documents and error is None
+    """
+    if not files:
+        return
+    max_workers = min(max_workers or PROCESS_WORKERS, len(files))
+
+    # Workers are spawned rather than forked: the parent may be a
+    # multi-threaded server process
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as executor:
+        futures = {
+            executor.submit(process_path, path, {"source": source}, strategy): source
+            for path, source in files
         }
-        documents.append(doc)
-    
-    return documents
\ No newline at end of file
+        for future in as_completed(futures):
+            source = futures[future]
+            try:
+                yield source, future.result(), None
+            except Exception as e:
+                logger.error("Error processing %s: %s", source, e)
+                yield source, None, e
@@ -0,0 +1,151 @@
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+from chromadb.utils import embedding_functions
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_EMBEDDING_BACKEND = "google"
+
+# Multilingual model (Hindi, Tamil, Telugu and English among others) small
+# enough to embed on the CPU; needs the optional sentence-transformers
+# package with its ONNX extra: pip install "sentence-transformers[onnx]"
+LOCAL_EMBEDDING_MODEL = "intfloat/multilingual-e5-small"
+
+# Int8-quantized ONNX export in the model repository; the plain ONNX export
+# is used when it is not available
+LOCAL_EMBEDDING_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+
+# Texts per inference call; ONNX Runtime spreads each call over all cores
+LOCAL_EMBEDDING_BATCH_SIZE = 64
+
+_models = {}
+_models_lock = threading.Lock()
+
+
+def _load_local_model(model_name: str, onnx_file: Optional[str]):
+    """Load a sentence-transformers model on the ONNX backend once per process.
+
+    Raises:
+        ImportError: If sentence-transformers or its ONNX extra is not installed
+    """
+    with _models_lock:
+        key = (model_name, onnx_file)
+        if key not in _models:
+            from sentence_transformers import SentenceTransformer
+
+            model = None
+            if onnx_file:
+                try:
+                    model = SentenceTransformer(
+                        model_name,
+                        device="cpu",
+                        backend="onnx",
+                        model_kwargs={"file_name": onnx_file},
+                    )
+                except (OSError, ValueError):
+                    logger.warning(
+                        "%s has no %s; using its plain ONNX export", model_name, onnx_file
+                    )
+            if model is None:
+                model = SentenceTransformer(model_name, device="cpu", backend="onnx")
+            _models[key] = model
+        return _models[key]
+
+
+class LocalEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma embedding function running a multilingual model on the local CPU.
+
+    The model is loaded on first use. E5 models are trained with "query: "
+    and "passage: " prefixes, which are added to queries and documents.
+    """
+
+    def __init__(
+        self,
+        model_name: str = LOCAL_EMBEDDING_MODEL,
+        onnx_file: Optional[str] = LOCAL_EMBEDDING_ONNX_FILE,
+        batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE,
+    ):
+        self.model_name = model_name
+        self.onnx_file = onnx_file
+        self.batch_size = batch_size
+        if "e5" in model_name.lower():
+            self._query_prefix, self._document_prefix = "query: ", "passage: "
+        else:
+            self._query_prefix = self._document_prefix = ""
+
+    def _encode(self, texts, prefix):
+        model = _load_local_model(self.model_name, self.onnx_file)
+        embeddings = model.encode(
+            [prefix + text for text in texts],
+            batch_size=self.batch_size,
+            normalize_embeddings=True,
+            convert_to_numpy=True,
+        )
+        return [np.asarray(embedding, dtype=np.float32) for embedding in embeddings]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._encode(input, self._document_prefix)
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        return self._encode(input, self._query_prefix)
+
+    @staticmethod
+    def name() -> str:
+        return "local_onnx"
+
+    def get_config(self) -> Dict[str, object]:
+        return {
+            "model_name": self.model_name,
+            "onnx_file": self.onnx_file,
+            "batch_size": self.batch_size,
+        }
+
+    @staticmethod
+    def build_from_config(config: Dict[str, object]) -> "LocalEmbeddingFunction":
+        return LocalEmbeddingFunction(**config)
+
+    def default_space(self):
+        return "cosine"
+
+    def supported_spaces(self):
+        return ["cosine", "l2", "ip"]
+
+
+def _google_backend(config) -> EmbeddingFunction:
+    if not config.api_key:
+        raise ValueError("An API key is required to embed texts")
+    return embedding_functions.GoogleGenerativeAiEmbeddingFunction(api_key=config.api_key)
+
+
+def _local_backend(config) -> EmbeddingFunction:
+    return LocalEmbeddingFunction(
+        config.local_embedding_model, config.local_embedding_onnx_file
+    )
+
+
+# Backend name -> factory building the embedding function from a KnowledgeBaseConfig
+EMBEDDING_BACKENDS: Dict[str, Callable[..., EmbeddingFunction]] = {
+    "google": _google_backend,
+    "local": _local_backend,
+}
+
+
+def register_embedding_backend(name: str, factory: Callable[..., EmbeddingFunction]):
+    """Make an embedding backend available under ``name``."""
+    EMBEDDING_BACKENDS[name] = factory
+
+
+def create_embedding_function(backend: str, config) -> EmbeddingFunction:
+    """Create the embedding function of a backend (see EMBEDDING_BACKENDS).
+
+    Raises:
+        ValueError: If the backend is unknown or not configured
+    """
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend: {backend}")
+    return EMBEDDING_BACKENDS[backend](config)
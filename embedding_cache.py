@@ -0,0 +1,229 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+import numpy as np
+from chromadb.api.types import Documents, EmbeddingFunction, Embeddings
+
+
+EMBEDDING_CACHE_PATH = os.path.join("data", "embedding_cache.db")
+
+# Upper bound on stored vectors; least recently used entries are evicted first
+EMBEDDING_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+# Hits refresh an entry's last-used time at most this often, so repeated
+# queries do not turn every cache read into a write
+_TOUCH_INTERVAL_SECONDS = 3600
+
+# SQLite limits the number of bound parameters per statement
+_MAX_PARAMS = 500
+
+
+def normalize_text(text):
+    """Normalize text for cache lookups (Unicode NFC, collapsed whitespace)."""
+    return unicodedata.normalize("NFC", " ".join(text.split()))
+
+
+def text_key(text):
+    """Return the cache key for a text: SHA-256 of its normalized form."""
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def embedding_model_id(embedding_function):
+    """Identify the model behind a Chroma embedding function, e.g. ``google_generative_ai:models/embedding-001``."""
+    name = embedding_function.name()
+    if name is NotImplemented:
+        name = type(embedding_function).__name__
+    config = embedding_function.get_config()
+    model_name = config.get("model_name", "") if isinstance(config, dict) else ""
+    return f"{name}:{model_name}"
+
+
+class EmbeddingCache:
+    """Persistent (model, text) -> embedding cache stored in SQLite.
+
+    Vectors are stored as raw float32 bytes. When the stored size exceeds
+    ``max_bytes`` the least recently used entries are evicted. Hit and miss
+    counters cover the lifetime of this object.
+    """
+
+    def __init__(self, path=EMBEDDING_CACHE_PATH, max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                key TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, key)
+            )
+            """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)"
+            )
+        self._total_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+        ).fetchone()[0]
+
+    def get_many(self, model, keys):
+        """Look up embeddings for ``keys``.
+
+        Returns:
+            Dict mapping each key found to its embedding (numpy float32 array)
+        """
+        now = time.time()
+        found = {}
+        stale = []
+        with self._lock:
+            for i in range(0, len(keys), _MAX_PARAMS):
+                batch = keys[i:i + _MAX_PARAMS]
+                placeholders = ", ".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, embedding, last_used FROM embeddings "
+                    f"WHERE model = ? AND key IN ({placeholders})",
+                    [model, *batch],
+                ).fetchall()
+                for key, blob, last_used in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+                    if now - last_used > _TOUCH_INTERVAL_SECONDS:
+                        stale.append((now, model, key))
+
+            if stale:
+                with self._conn:
+                    self._conn.executemany(
+                        "UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                        stale,
+                    )
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, model, items):
+        """Store ``(key, embedding)`` pairs, evicting old entries if over budget."""
+        now = time.time()
+        rows = []
+        for key, embedding in items:
+            blob = np.asarray(embedding, dtype=np.float32).tobytes()
+            rows.append((model, key, blob, len(blob), now))
+
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, key, embedding, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self._total_bytes += sum(row[3] for row in rows)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache is back under 90% of its budget."""
+        with self._conn:
+            self._total_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM embeddings"
+            ).fetchone()[0]
+            excess = self._total_bytes - int(self.max_bytes * 0.9)
+            if excess <= 0:
+                return
+
+            victims = []
+            freed = 0
+            for rowid, size in self._conn.execute(
+                "SELECT rowid, size FROM embeddings ORDER BY last_used"
+            ):
+                victims.append((rowid,))
+                freed += size
+                if freed >= excess:
+                    break
+            self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", victims)
+            self._total_bytes -= freed
+
+    def stats(self):
+        """Return hit/miss counters and the stored size."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "bytes": self._total_bytes,
+        }
+
+
+class CachedEmbeddingFunction(EmbeddingFunction[Documents]):
+    """Chroma embedding function that serves repeated texts from an EmbeddingCache.
+
+    Only texts missing from the cache are sent to the wrapped embedding
+    function. Query embeddings are cached separately from document
+    embeddings when the wrapped function embeds queries differently.
+    """
+
+    def __init__(self, embedding_function, cache, model=None):
+        self._inner = embedding_function
+        self.cache = cache
+        if model is None:
+            model = embedding_model_id(embedding_function)
+        self.model = model
+
+    def _embed(self, texts, model, embed):
+        keys = [text_key(text) for text in texts]
+        cached = self.cache.get_many(model, list(set(keys)))
+
+        # Embed each distinct missing text once
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in missing:
+                missing[key] = text
+        if missing:
+            computed = embed(list(missing.values()))
+            new_items = list(zip(missing.keys(), computed))
+            self.cache.put_many(model, new_items)
+            cached.update(
+                (key, np.asarray(embedding, dtype=np.float32))
+                for key, embedding in new_items
+            )
+
+        return [cached[key] for key in keys]
+
+    def __call__(self, input: Documents) -> Embeddings:
+        return self._embed(input, self.model, self._inner)
+
+    def embed_query(self, input: Documents) -> Embeddings:
+        if type(self._inner).embed_query is EmbeddingFunction.embed_query:
+            return self(input)
+        return self._embed(input, f"{self.model}#query", self._inner.embed_query)
+
+    # Chroma records the embedding function in the collection configuration;
+    # report the wrapped function so existing collections stay compatible.
+    def name(self):
+        return self._inner.name()
+
+    def get_config(self):
+        return self._inner.get_config()
+
+    def build_from_config(self, config):
+        return self._inner.build_from_config(config)
+
+    def default_space(self):
+        return self._inner.default_space()
+
+    def supported_spaces(self):
+        return self._inner.supported_spaces()
@@ -1,10 +1,12 @@
 import json
+import time
 from PIL import Image
 import streamlit as st
 from google import genai
 from google.genai.types import Content, Part, UserContent, GenerateContentConfig
 import speech_recognition as sr
 import requests
+from metrics import record_metric
 
 
 # Language support
@@ -243,16 +245,52 @@ def create_chat(client, history=None, language="en"):
     return chat
 
 
-def get_response(chat, prompt):
+def _prompt_parts(prompt):
+    """Build the message parts (text and images) for a prompt."""
     parts = [prompt.text] if prompt.text else []
     for file_content in prompt.files if hasattr(prompt, "files") else []:
         img = Image.open(file_content)
         parts.append(img)
+    return parts
+
+
+def get_response(chat, prompt):
+    parts = _prompt_parts(prompt)
 
     response = chat.send_message(parts)
     return response.text, chat.get_history()
 
 
+def stream_response(chat, prompt):
+    """Send a prompt and yield the response text as it is generated.
+
+    The chat history is updated once the stream is exhausted; read it with
+    ``chat.get_history()`` afterwards. Time to first token and total
+    latency are recorded as metrics.
+    """
+    parts = _prompt_parts(prompt)
+
+    start = time.perf_counter()
+    first_token = None
+    for chunk in chat.send_message_stream(parts):
+        if not chunk.text:
+            continue
+        if first_token is None:
+            first_token = time.perf_counter() - start
+            record_metric("response_ttft_seconds", first_token, model=MODEL_NAME)
+        yield chunk.text
+
+    record_metric("response_total_seconds", time.perf_counter() - start, model=MODEL_NAME)
+
+
+def history_from_turn(user_text, model_text):
+    """Build the chat history entries for one question and answer."""
+    return [
+        Content(role="user", parts=[Part(text=user_text)]),
+        Content(role="model", parts=[Part(text=model_text)]),
+    ]
+
+
 def get_image_descrption(files, language="en"):
     """
     Get image description using Google GenAI
@@ -1,6 +1,13 @@
+import os
+import tempfile
+import zipfile
 import streamlit as st
 import time
-from document_processor import process_document
+from chunking import CHUNKERS, DEFAULT_STRATEGY
+from document_processor import extract_zip
+from embedding_backends import EMBEDDING_BACKENDS
+from index_profiles import INDEX_PROFILES
+from upload_jobs import UploadJob
 from vector_store import (
     get_document_sources,
     delete_document,
@@ -11,6 +18,7 @@ from vector_store import (
     get_default_collection_name,
     set_default_collection,
     delete_collection,
+    get_knowledge_base,
 )
 
 
@@ -21,6 +29,61 @@ if admin_key != st.secrets["admin_key"]:
     st.stop()
 
 
+def start_upload_job(uploads, strategy):
+    """Spool the uploads to disk and add them to the default collection in the background."""
+    # Worker processes read the files from disk; the job removes the directory
+    upload_dir = tempfile.mkdtemp(prefix="upload-")
+    files = []
+    results = []
+    for n, upload in enumerate(uploads):
+        if upload.name.lower().endswith(".zip"):
+            try:
+                files.extend(extract_zip(upload, upload_dir))
+            except zipfile.BadZipFile as e:
+                results.append({"file": upload.name, "status": f"❌ {e}"})
+            continue
+        path = os.path.join(upload_dir, f"upload-{n}{os.path.splitext(upload.name)[1].lower()}")
+        with open(path, "wb") as f:
+            f.write(upload.getbuffer())
+        files.append((path, upload.name))
+
+    return UploadJob(
+        get_knowledge_base(), get_default_collection_name(), files, upload_dir, strategy, results
+    ).start()
+
+
+@st.fragment(run_every=1)
+def show_upload_job():
+    """Show the progress of the running upload job, rerunning the page when it is done."""
+    job = st.session_state.upload_job
+    if not job.done:
+        st.progress(job.progress)
+        st.text(job.status)
+        return
+
+    results = job.results
+    failed = [r for r in results if not r["status"].startswith("✅")]
+    st.session_state.upload_complete = True
+    st.session_state.upload_results = results
+    if not results:
+        st.session_state.upload_message = "No supported documents found."
+        st.session_state.upload_status = "error"
+    elif failed:
+        st.session_state.upload_message = (
+            f"{len(failed)} of {len(results)} files could not be added. "
+            "Process them again to resume."
+        )
+        st.session_state.upload_status = "error"
+    else:
+        added = sum(r["added"] for r in results)
+        st.session_state.upload_message = (
+            f"Added {added} new chunks from {len(results)} file(s) to knowledge base"
+        )
+        st.session_state.upload_status = "success"
+    st.session_state.upload_job = None
+    st.rerun()
+
+
 def main():
     """Knowledge Base Management Page"""
 
@@ -198,8 +261,8 @@ def main():
         st.session_state.upload_message = ""
     if "upload_status" not in st.session_state:
         st.session_state.upload_status = ""
-    if "processing" not in st.session_state:
-        st.session_state.processing = False
+    if "upload_job" not in st.session_state:
+        st.session_state.upload_job = None
     if "delete_confirmation" not in st.session_state:
         st.session_state.delete_confirmation = {}
     if "show_collection_delete" not in st.session_state:
@@ -232,19 +295,31 @@ def main():
 
             # File uploader with enhanced UI
             #st.markdown('<div class="upload-section">', unsafe_allow_html=True)
-            uploaded_file = st.file_uploader(
-                "Select a document to add to your knowledge base",
-                type=["pdf", "txt", "docx", "csv"],
-                help="Upload PDFs, text files, Word documents or CSV files",
-                key="uploaded_file",
+            uploaded_files = st.file_uploader(
+                "Select documents to add to your knowledge base",
+                type=["pdf", "txt", "md", "csv", "zip"],
+                help="Upload PDFs, text, Markdown or CSV files, or a zip archive of them",
+                accept_multiple_files=True,
+                key="uploaded_files",
+            )
+            st.selectbox(
+                "Chunking strategy",
+                list(CHUNKERS),
+                index=list(CHUNKERS).index(DEFAULT_STRATEGY),
+                help="recursive: paragraphs, then lines, then sentences; sentence: whole sentences; "
+                "token: fixed number of words; fixed: fixed-size windows",
+                key="chunking_strategy",
             )
 
             # Process button with improved UI
-            if uploaded_file:
+            if uploaded_files:
                 file_info_col1, file_info_col2 = st.columns([3, 1])
                 with file_info_col1:
-                    st.markdown(f"**Selected file:** `{uploaded_file.name}`")
-                    file_size = round(uploaded_file.size / 1024, 2)
+                    if len(uploaded_files) == 1:
+                        st.markdown(f"**Selected file:** `{uploaded_files[0].name}`")
+                    else:
+                        st.markdown(f"**Selected files:** `{len(uploaded_files)}`")
+                    file_size = round(sum(f.size for f in uploaded_files) / 1024, 2)
                     size_unit = "KB"
                     if file_size > 1024:
                         file_size = round(file_size / 1024, 2)
@@ -252,41 +327,23 @@ def main():
                     st.markdown(f"**Size:** `{file_size} {size_unit}`")
                 
                 with file_info_col2:
-                    process_button = st.button("Process", type="primary", use_container_width=True)
+                    process_button = st.button(
+                        "Process",
+                        type="primary",
+                        use_container_width=True,
+                        disabled=st.session_state.upload_job is not None,
+                    )
                     if process_button:
-                        st.session_state.file_to_process = uploaded_file
-                        st.session_state.processing = True
+                        st.session_state.upload_complete = False
+                        st.session_state.upload_job = start_upload_job(
+                            uploaded_files, st.session_state.chunking_strategy
+                        )
                         st.rerun()
             st.markdown('</div>', unsafe_allow_html=True)
             
-            # Handle processing state
-            if st.session_state.processing:
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                for i in range(100):
-                    progress_bar.progress(i + 1)
-                    status_update = "Extracting text..." if i < 30 else "Processing content..." if i < 70 else "Adding to knowledge base..."
-                    status_text.text(status_update)
-                    time.sleep(0.01)
-                
-                file = st.session_state.file_to_process
-                documents = process_document(file, {"source": file.name})
-                
-                if documents:
-                    count = add_documents(documents)
-                    st.session_state.upload_complete = True
-                    st.session_state.upload_message = f"Added {count} chunks from {file.name} to knowledge base"
-                    st.session_state.upload_status = "success"
-                else:
-                    st.session_state.upload_complete = True
-                    st.session_state.upload_message = "Failed to process document. Check the file format."
-                    st.session_state.upload_status = "error"
-                
-                # Reset processing flag
-                st.session_state.processing = False
-                st.session_state.file_to_process = None
-                st.rerun()
+            # Documents are added on a background thread; the page polls it
+            if st.session_state.upload_job is not None:
+                show_upload_job()
 
             # Display status message from previous uploads if any
             if st.session_state.upload_complete:
@@ -294,6 +351,8 @@ def main():
                     st.success(st.session_state.upload_message)
                 elif st.session_state.upload_status == "error":
                     st.error(st.session_state.upload_message)
+                if st.session_state.get("upload_results"):
+                    st.dataframe(st.session_state.upload_results, hide_index=True, use_container_width=True)
 
             st.divider()
             
@@ -402,12 +461,25 @@ def main():
                                 </div>
                                 """, unsafe_allow_html=True)
                                 
+                                ingested = (
+                                    time.strftime("%Y-%m-%d %H:%M", time.localtime(info["ingested_at"]))
+                                    if info.get("ingested_at")
+                                    else "unknown"
+                                )
                                 st.markdown(f"""
                                 <div style="display: flex; gap: 10px; margin-top: 5px;">
                                     <div class="doc-stat">
                                         <span class="doc-stat-label">CHUNKS</span>
                                         <span class="doc-stat-value"> {info['chunks']}</span>
                                     </div>
+                                    <div class="doc-stat">
+                                        <span class="doc-stat-label">SIZE</span>
+                                        <span class="doc-stat-value"> {info.get('bytes', 0) / 1024:.1f} KB</span>
+                                    </div>
+                                    <div class="doc-stat">
+                                        <span class="doc-stat-label">INGESTED</span>
+                                        <span class="doc-stat-value"> {ingested}</span>
+                                    </div>
                                 </div>
                                 """, unsafe_allow_html=True)
                             
@@ -453,6 +525,32 @@ def main():
                 "Collection Name:", key="new_collection_name", 
                 placeholder="Enter collection name..."
             )
+            backends = list(EMBEDDING_BACKENDS)
+            configured_backend = get_knowledge_base().config.embedding_backend
+            embedding_backend = st.selectbox(
+                "Embedding model:",
+                backends,
+                # The secrets may name a backend that is not registered
+                index=backends.index(configured_backend) if configured_backend in backends else 0,
+                key="new_collection_backend",
+                help="google embeds with the Gemini API; local runs a multilingual model on this server's CPU. "
+                "A collection always keeps the model it was created with.",
+            )
+            profiles = list(INDEX_PROFILES)
+            configured_profile = get_knowledge_base().config.index_profile
+            if not (isinstance(configured_profile, str) and configured_profile in INDEX_PROFILES):
+                # Settings from the secrets; None has the collection created with them
+                profiles.insert(0, None)
+                configured_profile = None
+            index_profile = st.selectbox(
+                "Index profile:",
+                profiles,
+                index=profiles.index(configured_profile),
+                format_func=lambda profile: "configured" if profile is None else profile,
+                key="new_collection_index_profile",
+                help="HNSW search index settings: fast trades some recall for speed, accurate the reverse. "
+                "Use benchmarks/hnsw_tuning.py to compare them on a real collection.",
+            )
             create_button = st.button("Create Collection", key="create_collection", type="primary", use_container_width=True)
             
             if create_button:
@@ -462,7 +560,9 @@ def main():
                 
                 if new_collection_name and new_collection_name not in collection_names:
                     with st.spinner(f"Creating collection '{new_collection_name}'..."):
-                        collection = create_collection(new_collection_name)
+                        collection = create_collection(
+                            new_collection_name, embedding_backend, index_profile
+                        )
                         if collection:
                             st.success(f"Created collection: {new_collection_name}")
                             time.sleep(0.5)
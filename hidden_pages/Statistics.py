@@ -1,5 +1,8 @@
 import streamlit as st
-from vector_store import query_collection
+from metrics import summarize_metrics
+from rerank import RERANK_METHODS
+from index_profiles import similarity_from_distance
+from vector_store import query_collection, get_collection_space, get_embedding_cache_stats
 
 admin_key = st.query_params.get("key", "invalid") # default is 'invalid'
 
@@ -138,48 +141,94 @@ def main():
     st.markdown("### Enter your search query")
     query = st.text_input("", placeholder="Enter keywords to search your documents", key="search_input")
     
-    col1, col2, col3 = st.columns([1.5, 1, 1.5])
+    col1, col2, col3, col4 = st.columns([1.5, 1, 1, 1.5])
     
     with col1:
         num_results = st.slider("Number of results:", min_value=1, max_value=20, value=5)
     
     with col2:
         min_relevance = st.slider("Min. relevance (%):", min_value=0, max_value=100, value=50)
-    
+
     with col3:
+        rerank = st.selectbox(
+            "Reranking:",
+            ["none", *RERANK_METHODS],
+            help="Over-fetch candidates and rerank them with BM25 fusion or a local cross-encoder",
+        )
+        hybrid = st.checkbox(
+            "Hybrid search",
+            value=True,
+            help="Fuse keyword (BM25) matches from the lexical index with the vector results",
+        )
+    
+    with col4:
         search_button = st.button("🔎 Search Documents", type="primary", use_container_width=True)
     
     # Show animated loading
     if search_button and query:
         with st.spinner("🔍 Searching knowledge base..."):
-            results = query_collection(query, n_results=num_results)
+            results = query_collection(
+                query, n_results=num_results, rerank=rerank, hybrid=hybrid
+            )
+
+            # Position of each result in a plain vector search, for comparison
+            compare = rerank != "none" or hybrid
+            vector_ranks = {}
+            if compare:
+                vector_results = query_collection(
+                    query, n_results=num_results, rerank="none", hybrid=False
+                )
+                vector_ranks = {
+                    chunk_id: rank for rank, chunk_id in enumerate(vector_results["ids"][0], start=1)
+                }
+                changed = sum(
+                    1 for chunk_id in results["ids"][0] if chunk_id not in vector_ranks
+                )
+                st.caption(
+                    f"{changed} of {len(results['ids'][0])} results "
+                    "are not in the vector-only top results"
+                )
             
             if results and results["documents"] and results["documents"][0]:
+                space = get_collection_space() or "l2"
                 filtered_results = []
                 # Process results with relevance filtering
-                for i, (doc, metadata, distance) in enumerate(zip(
+                for i, (chunk_id, doc, metadata, distance) in enumerate(zip(
+                    results["ids"][0],
                     results["documents"][0], 
                     results["metadatas"][0],
                     results["distances"][0]
                 )):
-                    relevance = (1 - distance) * 100  # Convert distance to relevance percentage
+                    if distance is None:
+                        # Keyword match of a hybrid search, without a vector distance
+                        filtered_results.append((chunk_id, doc, metadata, None))
+                        continue
+                    # Convert the distance to a relevance percentage for the index's space
+                    relevance = similarity_from_distance(distance, space) * 100
                     if relevance >= min_relevance:
-                        filtered_results.append((doc, metadata, relevance))
+                        filtered_results.append((chunk_id, doc, metadata, relevance))
                 
                 # Show results count
                 if filtered_results:
                     st.markdown(f'<div class="success-icon">✅ Found {len(filtered_results)} relevant passages with {min_relevance}%+ relevance</div>', unsafe_allow_html=True)
                     
                     # Display search results with properly styled expanders
-                    for i, (doc, metadata, relevance) in enumerate(filtered_results):
+                    for i, (chunk_id, doc, metadata, relevance) in enumerate(filtered_results):
                         source = metadata.get('source', 'Unknown document')
+                        if relevance is None:
+                            title = f"📄 {source} (Keyword match)"
+                        else:
+                            title = f"📄 {source} (Relevance: {relevance:.1f}%)"
+                        if compare:
+                            vector_rank = vector_ranks.get(chunk_id)
+                            title += f" · vector rank: {vector_rank or 'not in top results'}"
                         
                         # Using streamlit expanders but with custom styling
-                        with st.expander(f"📄 {source} (Relevance: {relevance:.1f}%)"):
+                        with st.expander(title):
                             # Simple relevance bar without images
                             st.markdown(f"""
                             <div class="relevance-bar">
-                                <div class="relevance-fill" style="width: {relevance}%;"></div>
+                                <div class="relevance-fill" style="width: {relevance or 0}%;"></div>
                             </div>
                             """, unsafe_allow_html=True)
                             
@@ -226,6 +275,44 @@ def main():
             </div>
             """, unsafe_allow_html=True)
 
+    # Latency of recent chat turns in this server process
+    with st.expander("⏱️ Response latency"):
+        summary = summarize_metrics()
+        latency = {
+            name: stats for name, stats in summary.items() if not name.startswith("context_")
+        }
+        if latency:
+            st.table(
+                [
+                    {
+                        "stage": name,
+                        "count": stats["count"],
+                        "p50 (s)": round(stats["p50"], 3),
+                        "p95 (s)": round(stats["p95"], 3),
+                        "max (s)": round(stats["max"], 3),
+                    }
+                    for name, stats in sorted(latency.items())
+                ]
+            )
+        else:
+            st.info("No chat turns recorded yet.")
+
+        if "context_tokens_used" in summary:
+            used = summary["context_tokens_used"]
+            dropped = summary["context_tokens_dropped"]
+            st.caption(
+                f"Prompt context: {used['mean']:.0f} tokens on average "
+                f"(p95 {used['p95']:.0f}), {dropped['mean']:.0f} tokens of retrieved "
+                "chunks dropped to fit the budget"
+            )
+
+        cache_stats = get_embedding_cache_stats()
+        st.caption(
+            f"Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses "
+            f"({cache_stats['hit_rate']:.0%} hit rate), "
+            f"{cache_stats['bytes'] / (1024 * 1024):.1f} MB stored"
+        )
+
 if __name__ == "__main__":
     st.set_page_config(
         page_title="Search Knowledge Base",
@@ -0,0 +1,78 @@
+from collections.abc import Mapping
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Optional, Union
+
+
+@dataclass(frozen=True)
+class IndexProfile:
+    """HNSW index settings of a collection.
+
+    ``space`` is the distance function ("cosine", "l2" or "ip"),
+    ``max_neighbors`` is HNSW's M, and ``ef_construction`` and ``ef_search``
+    are the candidate list sizes when building and searching the graph.
+    Settings left as None use ChromaDB's defaults (for the space: the
+    embedding function's default, cosine for the embedding backends here).
+    """
+
+    space: Optional[str] = None
+    max_neighbors: Optional[int] = None
+    ef_construction: Optional[int] = None
+    ef_search: Optional[int] = None
+
+    def configuration(self) -> Optional[Dict[str, Any]]:
+        """ChromaDB collection configuration for this profile, or None for the defaults."""
+        hnsw = {key: value for key, value in asdict(self).items() if value is not None}
+        return {"hnsw": hnsw} if hnsw else None
+
+
+# Named profiles; benchmarks/hnsw_tuning.py measures the trade-offs on a
+# real collection
+INDEX_PROFILES = {
+    "default": IndexProfile(),
+    "fast": IndexProfile(max_neighbors=12, ef_construction=64, ef_search=32),
+    "accurate": IndexProfile(max_neighbors=32, ef_construction=200, ef_search=200),
+}
+
+DEFAULT_INDEX_PROFILE = "default"
+
+
+def get_index_profile(profile: Union[str, Mapping, IndexProfile, None]) -> IndexProfile:
+    """Resolve a profile name (see INDEX_PROFILES) or a mapping of settings.
+
+    Raises:
+        ValueError: If the profile name or a setting is unknown
+    """
+    if profile is None:
+        profile = DEFAULT_INDEX_PROFILE
+    if isinstance(profile, IndexProfile):
+        return profile
+    if isinstance(profile, Mapping):
+        unknown = set(profile) - {field.name for field in fields(IndexProfile)}
+        if unknown:
+            raise ValueError(f"Unknown index profile settings: {', '.join(sorted(unknown))}")
+        return IndexProfile(**dict(profile))
+    if profile not in INDEX_PROFILES:
+        raise ValueError(f"Unknown index profile: {profile}")
+    return INDEX_PROFILES[profile]
+
+
+def collection_space(collection) -> str:
+    """Distance function of a collection's HNSW index."""
+    configuration = getattr(collection, "configuration", None) or {}
+    space = (configuration.get("hnsw") or {}).get("space")
+    return space or (collection.metadata or {}).get("hnsw:space", "l2")
+
+
+def similarity_from_distance(distance: float, space: str) -> float:
+    """Convert a query distance to a similarity between 0 and 1.
+
+    For cosine and inner product spaces the similarity is the cosine
+    similarity (assuming unit-length embeddings for "ip"). ChromaDB's "l2"
+    is the squared Euclidean distance, which for unit-length embeddings is
+    2 - 2 * cosine similarity; both embedding backends here normalize.
+    """
+    if space == "l2":
+        similarity = 1 - distance / 2
+    else:
+        similarity = 1 - distance
+    return min(1.0, max(0.0, similarity))
@@ -0,0 +1,237 @@
+"""Ingest documents into the knowledge base from the command line.
+
+Extracts and chunks documents in parallel worker processes and adds them
+to a ChromaDB collection in rate-limited embedding batches, like the
+upload page, without starting Streamlit. Examples:
+
+    python ingest.py manuals/ --collection first_aid
+    python ingest.py "docs/**/*.pdf" extra.txt --collection first_aid --dry-run
+    python ingest.py manuals/ --collection first_aid --resume
+
+The Gemini API key is read from the GEN_AI_API_KEY environment variable
+(or a .env file) and otherwise from gen_ai_api_key in .streamlit/secrets.toml.
+It is not needed for collections embedded with the local backend.
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+
+from chunking import CHUNKERS, DEFAULT_STRATEGY
+from document_processor import FILE_TYPES, PROCESS_WORKERS, process_paths
+from embedding_backends import EMBEDDING_BACKENDS
+from index_profiles import INDEX_PROFILES
+from ingestion import EMBEDDING_BATCH_SIZE, INGEST_WORKERS, IngestionError, plan_source_chunks
+from knowledge_base import SECRETS_PATH, KnowledgeBase, KnowledgeBaseConfig
+
+
+logger = logging.getLogger("ingest")
+
+# Files ingested successfully (size and mtime per path and collection), so
+# --resume can skip them while unchanged
+STATE_PATH = os.path.join("data", "ingest_state.json")
+
+
+def find_files(patterns):
+    """Expand files, directories (recursively) and glob patterns to supported files.
+
+    Returns:
+        Sorted list of unique absolute paths
+    """
+    found = set()
+    for pattern in patterns:
+        matches = glob.glob(pattern, recursive=True) if glob.has_magic(pattern) else [pattern]
+        if not matches:
+            logger.warning("No files match %s", pattern)
+        for match in matches:
+            if os.path.isdir(match):
+                for root, _, names in os.walk(match):
+                    found.update(os.path.join(root, name) for name in names)
+            else:
+                found.add(match)
+    return sorted(
+        os.path.abspath(path)
+        for path in found
+        if os.path.splitext(path)[1].lower() in FILE_TYPES
+    )
+
+
+def load_state(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, path)
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def source_name(path, roots):
+    """Name a file by its path relative to the directory it was found in."""
+    for root in roots:
+        if os.path.isdir(root) and path.startswith(os.path.abspath(root) + os.sep):
+            return os.path.relpath(path, os.path.abspath(root))
+    return os.path.basename(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Ingest documents into a knowledge-base collection."
+    )
+    parser.add_argument(
+        "paths", nargs="+", help="Files, directories or glob patterns (quote them)"
+    )
+    parser.add_argument("-c", "--collection", required=True, help="Target collection")
+    parser.add_argument(
+        "-j", "--workers", type=int, default=PROCESS_WORKERS,
+        help="Processes extracting documents (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--embed-workers", type=int, default=INGEST_WORKERS,
+        help="Embedding batches in flight (default: %(default)s)",
+    )
+    parser.add_argument(
+        "-b", "--batch-size", type=int, default=EMBEDDING_BATCH_SIZE,
+        help="Chunks per embedding batch (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--strategy", choices=list(CHUNKERS), default=DEFAULT_STRATEGY,
+        help="Chunking strategy (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--embedding-backend", choices=list(EMBEDDING_BACKENDS),
+        help="Embedding backend if the collection is created (default from the secrets: google)",
+    )
+    parser.add_argument(
+        "--index-profile", choices=list(INDEX_PROFILES),
+        help="HNSW index profile if the collection is created (default from the secrets: default)",
+    )
+    parser.add_argument(
+        "-n", "--dry-run", action="store_true",
+        help="Extract and diff documents against the collection without changing it",
+    )
+    parser.add_argument(
+        "--resume", action="store_true",
+        help="Skip files that were ingested successfully and have not changed since",
+    )
+    parser.add_argument(
+        "--state-file", default=STATE_PATH, help="Where --resume keeps track of ingested files"
+    )
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s",
+    )
+
+    paths = find_files(args.paths)
+    # Documents are identified by source name, so two files with the same
+    # name would overwrite each other's chunks
+    names = {}
+    seen = {}
+    for path in paths:
+        names[path] = source_name(path, args.paths)
+        seen.setdefault(names[path], []).append(path)
+    clashes = [f"{source}: {', '.join(group)}" for source, group in seen.items() if len(group) > 1]
+    if clashes:
+        parser.error(
+            "files with the same source name; ingest them separately:\n  " + "\n  ".join(clashes)
+        )
+
+    state = load_state(args.state_file)
+    done = state.setdefault(args.collection, {})
+    if args.resume:
+        pending = [p for p in paths if done.get(p) != file_signature(p)]
+        logger.info("Skipping %d unchanged files ingested before", len(paths) - len(pending))
+        paths = pending
+    if not paths:
+        logger.info("Nothing to ingest")
+        return 0
+
+    overrides = {"batch_size": args.batch_size, "ingest_workers": args.embed_workers}
+    if args.embedding_backend:
+        overrides["embedding_backend"] = args.embedding_backend
+    if args.index_profile:
+        overrides["index_profile"] = args.index_profile
+    config = KnowledgeBaseConfig.from_environment(**overrides)
+    if config.embedding_backend == "google" and not config.api_key:
+        parser.error(f"set GEN_AI_API_KEY or gen_ai_api_key in {SECRETS_PATH}")
+    knowledge_base = KnowledgeBase(config)
+    # A dry run must not create the collection
+    collection = knowledge_base.get_collection(args.collection) if args.dry_run else None
+
+    sources = {names[p]: p for p in paths}
+    totals = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+    failed = 0
+    started = time.monotonic()
+    logger.info("Processing %d files with %d workers", len(paths), args.workers)
+
+    try:
+        files = [(path, source) for source, path in sources.items()]
+        for source, documents, error in process_paths(files, args.workers, args.strategy):
+            if error is not None or not documents:
+                failed += 1
+                logger.error("%s: %s", source, error or "no text found")
+                continue
+
+            texts = [doc["text"] for doc in documents]
+            metadatas = [doc["metadata"] for doc in documents]
+            if args.dry_run:
+                if collection is None:
+                    counts = {"added": len(set(texts)), "updated": 0, "unchanged": 0, "deleted": 0}
+                else:
+                    plan = plan_source_chunks(collection, source, texts, metadatas)
+                    counts = {
+                        "added": len(plan["new"]),
+                        "updated": len(plan["moved"]),
+                        "unchanged": len(plan["chunks"]) - len(plan["new"]) - len(plan["moved"]),
+                        "deleted": len(plan["stale"]),
+                    }
+            else:
+                try:
+                    counts = knowledge_base.add_documents(documents, args.collection)
+                except IngestionError as e:
+                    failed += 1
+                    totals["added"] += e.added
+                    logger.error("%s: %s (%d chunks added)", source, e, e.added)
+                    continue
+                done[sources[source]] = file_signature(sources[source])
+
+            for key, value in counts.items():
+                totals[key] += value
+            logger.info(
+                "%s: %d chunks, %d new, %d updated, %d unchanged, %d removed",
+                source, len(texts), counts["added"], counts["updated"], counts["unchanged"],
+                counts["deleted"],
+            )
+    finally:
+        if not args.dry_run:
+            save_state(args.state_file, state)
+
+    logger.info(
+        "%s %d new, %d updated, %d unchanged and %d removed chunks from %d files in %.1fs; "
+        "%d failed",
+        "Would add" if args.dry_run else "Added",
+        totals["added"], totals["updated"], totals["unchanged"], totals["deleted"],
+        len(paths) - failed, time.monotonic() - started, failed,
+    )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
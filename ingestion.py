@@ -0,0 +1,279 @@
+import hashlib
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, List, Optional
+
+from paging import iter_collection
+
+
+logger = logging.getLogger(__name__)
+
+# Chunks embedded and written per batch
+EMBEDDING_BATCH_SIZE = 50
+
+# Batches embedded concurrently
+INGEST_WORKERS = 4
+
+# Chunks embedded per second (sustained) and in a burst. The rate limiter
+# charges one token per chunk: the Gemini embedding function sends one
+# request per text, so this is also the request rate.
+EMBEDDING_CHUNKS_PER_SECOND = 20.0
+EMBEDDING_BURST = 100
+
+# Attempts per batch before it is reported as failed
+MAX_BATCH_ATTEMPTS = 5
+
+
+class IngestionError(Exception):
+    """Raised when some batches could not be embedded or stored.
+
+    Batches that were committed stay in the collection, so ingesting the
+    same documents again resumes with the failed batches.
+    """
+
+    def __init__(self, message, added=0, failed_batches=None):
+        super().__init__(message)
+        self.added = added
+        self.failed_batches = failed_batches or []
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    ``acquire`` blocks until the requested number of tokens is available.
+    """
+
+    def __init__(self, rate=EMBEDDING_CHUNKS_PER_SECOND, capacity=EMBEDDING_BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        # A request larger than the bucket would never fit; let it drain the bucket
+        tokens = min(tokens, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(
+                    self.capacity, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def make_batches(items: List[Any], batch_size: int) -> List[List[Any]]:
+    """Split ``items`` into consecutive batches of at most ``batch_size``."""
+    return [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+
+def _with_retries(fn, attempts, base_delay=1.0, max_delay=60.0):
+    """Call ``fn``, retrying with exponential backoff and jitter on any exception."""
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            delay = min(max_delay, base_delay * 2**attempt) * (0.5 + random.random())
+            logger.warning(
+                "Attempt %d/%d failed (%s); retrying in %.1fs", attempt + 1, attempts, e, delay
+            )
+            time.sleep(delay)
+
+
+def ingest_chunks(
+    collection,
+    embedding_function,
+    ids: List[str],
+    texts: List[str],
+    metadatas: List[Dict[str, Any]],
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_workers: int = INGEST_WORKERS,
+    rate_limiter: Optional[TokenBucket] = None,
+    max_attempts: int = MAX_BATCH_ATTEMPTS,
+    on_progress: Optional[Callable[[Dict[str, Any]], None]] = None,
+) -> int:
+    """Embed and add chunks to a collection in concurrent, retried batches.
+
+    Batches whose ids are all present in the collection already are
+    skipped, so re-running an interrupted ingestion resumes after the last
+    committed batch. Embeddings are computed in worker threads; writes to
+    the collection happen one batch at a time.
+
+    Args:
+        collection: Target ChromaDB collection
+        embedding_function: Function mapping a list of texts to embeddings
+        ids, texts, metadatas: Parallel lists describing the chunks
+        batch_size: Chunks per embedding request batch
+        max_workers: Batches embedded concurrently
+        rate_limiter: Limits embedding calls (one token per chunk)
+        max_attempts: Attempts per batch before giving up on it
+        on_progress: Called from the calling thread after each batch with
+            {"done", "total", "batch", "batches", "status"}
+
+    Returns:
+        int: Number of chunks in the collection from this call (added or already present)
+
+    Raises:
+        IngestionError: If any batch still failed after all attempts
+    """
+    if rate_limiter is None:
+        rate_limiter = TokenBucket()
+
+    batches = make_batches(list(range(len(ids))), batch_size)
+    write_lock = threading.Lock()
+
+    def run_batch(indices):
+        batch_ids = [ids[i] for i in indices]
+        existing = set(collection.get(ids=batch_ids, include=[])["ids"])
+        todo = [i for i in indices if ids[i] not in existing]
+        if not todo:
+            return "skipped"
+
+        batch_texts = [texts[i] for i in todo]
+
+        def embed():
+            rate_limiter.acquire(len(batch_texts))
+            return embedding_function(batch_texts)
+
+        embeddings = _with_retries(embed, max_attempts)
+
+        def write():
+            with write_lock:
+                collection.add(
+                    ids=[ids[i] for i in todo],
+                    embeddings=embeddings,
+                    documents=batch_texts,
+                    metadatas=[metadatas[i] for i in todo],
+                )
+
+        _with_retries(write, max_attempts)
+        return "added"
+
+    done = 0
+    failed = []
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ingest") as executor:
+        futures = {executor.submit(run_batch, b): n for n, b in enumerate(batches)}
+        for finished, future in enumerate(as_completed(futures), start=1):
+            n = futures[future]
+            try:
+                status = future.result()
+                done += len(batches[n])
+            except Exception as e:
+                logger.error("Batch %d failed: %s", n, e)
+                status = "failed"
+                failed.append(n)
+            if on_progress is not None:
+                on_progress(
+                    {
+                        "done": done,
+                        "total": len(ids),
+                        "batch": finished,
+                        "batches": len(batches),
+                        "status": status,
+                    }
+                )
+
+    if failed:
+        raise IngestionError(
+            f"{len(failed)} of {len(batches)} batches could not be added",
+            added=done,
+            failed_batches=sorted(failed),
+        )
+    return done
+
+
+def chunk_id(source: str, text: str) -> str:
+    """Derive a stable chunk id from its source and content (SHA-256 hex)."""
+    return hashlib.sha256(f"{source}\x00{text}".encode("utf-8")).hexdigest()
+
+
+def plan_source_chunks(
+    collection, source: str, texts: List[str], metadatas: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """Diff a document's chunks against those stored for its source.
+
+    Returns:
+        Dict with "chunks" (chunk id -> (text, metadata), identical chunks
+        merged) and the lists of chunk ids that are "new", "stale" (stored
+        but no longer in the document) and "moved" (stored with different
+        metadata)
+    """
+    chunks = {}
+    for text, metadata in zip(texts, metadatas):
+        chunks.setdefault(chunk_id(source, text), (text, metadata))
+
+    existing_metadatas = {}
+    for page in iter_collection(collection, ["metadatas"], where={"source": source}):
+        existing_metadatas.update(zip(page["ids"], page["metadatas"]))
+
+    return {
+        "chunks": chunks,
+        "new": [i for i in chunks if i not in existing_metadatas],
+        "stale": [i for i in existing_metadatas if i not in chunks],
+        "moved": [
+            i
+            for i in chunks
+            if i in existing_metadatas and existing_metadatas[i] != chunks[i][1]
+        ],
+    }
+
+
+def sync_source_chunks(
+    collection, embedding_function, plan: Dict[str, Any], **ingest_options
+) -> Dict[str, int]:
+    """Make the chunks stored for a source match a document.
+
+    Chunk ids are content hashes, so only chunks that are new or changed
+    are embedded. Chunks of the source that no longer appear are deleted
+    once the new ones are committed, and chunks with unchanged text only
+    get their metadata (e.g. chunk position) refreshed.
+
+    Args:
+        collection: Target ChromaDB collection
+        embedding_function: Function mapping a list of texts to embeddings
+        plan: The document's plan_source_chunks against ``collection``
+        **ingest_options: Passed to ingest_chunks
+
+    Returns:
+        Dict: {"added": int, "updated": int, "unchanged": int, "deleted": int},
+        with "updated" counting chunks whose metadata was rewritten
+
+    Raises:
+        IngestionError: If some new chunks could not be added; stale chunks
+            are kept in that case
+    """
+    chunks = plan["chunks"]
+
+    added = 0
+    if plan["new"]:
+        added = ingest_chunks(
+            collection,
+            embedding_function,
+            plan["new"],
+            [chunks[i][0] for i in plan["new"]],
+            [chunks[i][1] for i in plan["new"]],
+            **ingest_options,
+        )
+
+    if plan["moved"]:
+        collection.update(ids=plan["moved"], metadatas=[chunks[i][1] for i in plan["moved"]])
+    if plan["stale"]:
+        collection.delete(ids=plan["stale"])
+
+    return {
+        "added": added,
+        "updated": len(plan["moved"]),
+        "unchanged": len(chunks) - len(plan["new"]) - len(plan["moved"]),
+        "deleted": len(plan["stale"]),
+    }
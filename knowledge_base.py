@@ -0,0 +1,689 @@
+"""Framework-free access to the knowledge base.
+
+KnowledgeBase bundles the ChromaDB client, the cached embedding function,
+the answer cache and the ingestion rate limiter behind explicit
+configuration, so the same retrieval and ingestion code runs in the
+Streamlit app (see vector_store), command-line tools, worker processes
+and benchmarks. Nothing here imports Streamlit.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+import chromadb
+from chromadb.errors import NotFoundError
+
+from answer_cache import ANSWER_CACHE_PATH, ANSWER_CACHE_THRESHOLD, AnswerCache
+from embedding_backends import (
+    DEFAULT_EMBEDDING_BACKEND,
+    LOCAL_EMBEDDING_MODEL,
+    LOCAL_EMBEDDING_ONNX_FILE,
+    create_embedding_function,
+)
+from embedding_cache import (
+    EMBEDDING_CACHE_MAX_BYTES,
+    EMBEDDING_CACHE_PATH,
+    CachedEmbeddingFunction,
+    EmbeddingCache,
+    embedding_model_id,
+)
+from index_profiles import DEFAULT_INDEX_PROFILE, collection_space, get_index_profile
+from ingestion import (
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BURST,
+    EMBEDDING_CHUNKS_PER_SECOND,
+    INGEST_WORKERS,
+    TokenBucket,
+    plan_source_chunks,
+    sync_source_chunks,
+)
+from lexical import LEXICAL_INDEX_PATH, LexicalIndex
+from metrics import record_metric, timed
+from paging import COLLECTION_PAGE_SIZE, delete_in_pages, iter_collection
+from rerank import RERANK_METHODS, candidate_count, fuse_results, rerank_results
+from source_manifest import SOURCE_MANIFEST_PATH, SourceManifest
+
+
+logger = logging.getLogger(__name__)
+
+CHROMA_PATH = os.path.join("data", "chromadb")
+SECRETS_PATH = os.path.join(".streamlit", "secrets.toml")
+
+# Hybrid queries return lexical results alone when the vector query
+# (which embeds the query remotely) takes longer than this
+QUERY_TIMEOUT_SECONDS = 5.0
+
+# Backend of collections created before the backend was recorded
+LEGACY_EMBEDDING_BACKEND = "google"
+
+
+class EmbeddingModelMismatch(Exception):
+    """A collection was built with another embedding model than its backend now uses."""
+
+
+@dataclass
+class KnowledgeBaseConfig:
+    """Settings of a KnowledgeBase; the defaults match the Streamlit app."""
+
+    api_key: Optional[str] = None
+    # Embedding backend of new collections, see embedding_backends
+    embedding_backend: str = DEFAULT_EMBEDDING_BACKEND
+    local_embedding_model: str = LOCAL_EMBEDDING_MODEL
+    local_embedding_onnx_file: Optional[str] = LOCAL_EMBEDDING_ONNX_FILE
+    # HNSW index of new collections: a name in index_profiles.INDEX_PROFILES
+    # or a dict of IndexProfile settings
+    index_profile: Union[str, Dict[str, Any]] = DEFAULT_INDEX_PROFILE
+    chroma_path: str = CHROMA_PATH
+    embedding_cache_path: str = EMBEDDING_CACHE_PATH
+    embedding_cache_max_bytes: int = EMBEDDING_CACHE_MAX_BYTES
+    answer_cache_path: str = ANSWER_CACHE_PATH
+    answer_cache_threshold: float = ANSWER_CACHE_THRESHOLD
+    lexical_index_path: str = LEXICAL_INDEX_PATH
+    source_manifest_path: str = SOURCE_MANIFEST_PATH
+    embedding_chunks_per_second: float = EMBEDDING_CHUNKS_PER_SECOND
+    embedding_burst: int = EMBEDDING_BURST
+    batch_size: int = EMBEDDING_BATCH_SIZE
+    ingest_workers: int = INGEST_WORKERS
+    # Default reranking of query results: None or one of rerank.RERANK_METHODS
+    rerank: Optional[str] = None
+    # Fuse BM25 results from the lexical index with the vector results
+    hybrid: bool = True
+    query_timeout: float = QUERY_TIMEOUT_SECONDS
+
+    @classmethod
+    def from_environment(cls, secrets_path=SECRETS_PATH, **overrides):
+        """Build a config for headless use.
+
+        The API key is read from GEN_AI_API_KEY (a .env file is loaded
+        first) or from gen_ai_api_key in the Streamlit secrets file, as are
+        embedding_backend, local_embedding_model, index_profile,
+        answer_cache_threshold, rerank, hybrid_search and query_timeout.
+        """
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        secrets = {}
+        if os.path.exists(secrets_path):
+            import tomllib
+
+            with open(secrets_path, "rb") as f:
+                secrets = tomllib.load(f)
+
+        settings = {
+            "api_key": os.environ.get("GEN_AI_API_KEY") or secrets.get("gen_ai_api_key"),
+            "embedding_backend": secrets.get("embedding_backend", DEFAULT_EMBEDDING_BACKEND),
+            "local_embedding_model": secrets.get("local_embedding_model", LOCAL_EMBEDDING_MODEL),
+            "index_profile": secrets.get("index_profile", DEFAULT_INDEX_PROFILE),
+            "answer_cache_threshold": secrets.get(
+                "answer_cache_threshold", ANSWER_CACHE_THRESHOLD
+            ),
+            "rerank": secrets.get("rerank"),
+            "hybrid": secrets.get("hybrid_search", True),
+            "query_timeout": secrets.get("query_timeout", QUERY_TIMEOUT_SECONDS),
+        }
+        settings.update(overrides)
+        return cls(**settings)
+
+
+class KnowledgeBase:
+    """Collections of embedded document chunks and the caches around them.
+
+    Resources are created on first use and are safe to share between
+    threads. ``embedding_function`` and ``client`` can be injected, e.g. to
+    use another embedding model for the configured backend or an in-memory
+    ChromaDB client.
+
+    Each collection records the embedding backend and model that built it,
+    and is always queried and extended with that backend. Collection
+    handles are cached, so only the first use of a collection in a process
+    looks it up; collections should therefore be created and deleted
+    through this class.
+    """
+
+    def __init__(self, config: KnowledgeBaseConfig = None, embedding_function=None, client=None):
+        self.config = config or KnowledgeBaseConfig()
+        self._client = client
+        self._embedding_functions = {}
+        if embedding_function is not None:
+            self._embedding_functions[self.config.embedding_backend] = embedding_function
+        self._embedding_cache = None
+        self._answer_cache = None
+        self._lexical_index = None
+        self._source_manifest = None
+        self._rate_limiter = None
+        self._query_executor = None
+        self._lock = threading.Lock()
+        # Collection name -> handle with the collection's embedding function
+        self._collections = {}
+        self._default_collection = None
+        # Collections whose lexical index was checked against the collection
+        self._lexical_synced = set()
+        self._lexical_sync_lock = threading.Lock()
+
+    @property
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                os.makedirs(self.config.chroma_path, exist_ok=True)
+                self._client = chromadb.PersistentClient(path=self.config.chroma_path)
+            return self._client
+
+    @property
+    def embedding_cache(self):
+        with self._lock:
+            if self._embedding_cache is None:
+                self._embedding_cache = EmbeddingCache(
+                    self.config.embedding_cache_path, self.config.embedding_cache_max_bytes
+                )
+            return self._embedding_cache
+
+    @property
+    def embedding_function(self):
+        """Embedding function of the configured backend, see get_embedding_function."""
+        return self.get_embedding_function(self.config.embedding_backend)
+
+    def get_embedding_function(self, backend: str):
+        """Embedding function of a backend, serving repeated texts from the embedding cache.
+
+        Raises:
+            ValueError: If the backend is unknown or not configured
+        """
+        if backend not in self._embedding_functions:
+            embedding_function = CachedEmbeddingFunction(
+                create_embedding_function(backend, self.config), self.embedding_cache
+            )
+            with self._lock:
+                self._embedding_functions.setdefault(backend, embedding_function)
+        return self._embedding_functions[backend]
+
+    @property
+    def answer_cache(self):
+        with self._lock:
+            if self._answer_cache is None:
+                self._answer_cache = AnswerCache(self.config.answer_cache_path)
+            return self._answer_cache
+
+    @property
+    def lexical_index(self):
+        with self._lock:
+            if self._lexical_index is None:
+                self._lexical_index = LexicalIndex(self.config.lexical_index_path)
+            return self._lexical_index
+
+    @property
+    def source_manifest(self):
+        with self._lock:
+            if self._source_manifest is None:
+                self._source_manifest = SourceManifest(self.config.source_manifest_path)
+            return self._source_manifest
+
+    @property
+    def query_executor(self):
+        """Threads running vector queries, so hybrid queries can time them out."""
+        with self._lock:
+            if self._query_executor is None:
+                self._query_executor = ThreadPoolExecutor(
+                    max_workers=4, thread_name_prefix="vector-query"
+                )
+            return self._query_executor
+
+    @property
+    def rate_limiter(self):
+        """Rate limiter shared by all ingestions through this knowledge base."""
+        with self._lock:
+            if self._rate_limiter is None:
+                self._rate_limiter = TokenBucket(
+                    self.config.embedding_chunks_per_second, self.config.embedding_burst
+                )
+            return self._rate_limiter
+
+    # Collections
+
+    @staticmethod
+    def collection_embedding_backend(collection) -> str:
+        """Name of the embedding backend that built a collection."""
+        return (collection.metadata or {}).get("embedding_backend", LEGACY_EMBEDDING_BACKEND)
+
+    def collection_embedding_function(self, collection):
+        """Embedding function to query and extend a collection with."""
+        return self.get_embedding_function(self.collection_embedding_backend(collection))
+
+    def _cache_collection(self, collection):
+        with self._lock:
+            return self._collections.setdefault(collection.name, collection)
+
+    def _open_collection(self, name: str):
+        collection = self._collections.get(name)
+        if collection is not None:
+            return collection
+
+        # Read the collection's embedding record before attaching an
+        # embedding function to it
+        collection = self.client.get_collection(name=name, embedding_function=None)
+        embedding_function = self.collection_embedding_function(collection)
+        recorded = (collection.metadata or {}).get("embedding_model")
+        if recorded and recorded != embedding_model_id(embedding_function):
+            raise EmbeddingModelMismatch(
+                f"Collection {name} was built with {recorded}, but the "
+                f"{self.collection_embedding_backend(collection)} backend now uses "
+                f"{embedding_model_id(embedding_function)}"
+            )
+        # Cache misses look the collection up a second time, with its
+        # embedding function attached
+        return self._cache_collection(
+            self.client.get_collection(name=name, embedding_function=embedding_function)
+        )
+
+    def _embedding_record(self, backend: str):
+        return {
+            "embedding_backend": backend,
+            "embedding_model": embedding_model_id(self.get_embedding_function(backend)),
+        }
+
+    def get_collection(self, name: str):
+        """Get an existing collection, or None if it doesn't exist.
+
+        Raises:
+            EmbeddingModelMismatch: If the collection's backend now uses another model
+        """
+        try:
+            return self._open_collection(name)
+        except (NotFoundError, ValueError):
+            return None
+
+    def create_collection(self, name: str, embedding_backend: str = None, index_profile=None):
+        """Create a new collection.
+
+        Args:
+            name: Collection name
+            embedding_backend: Backend embedding its chunks (default from config)
+            index_profile: HNSW index settings, see index_profiles.get_index_profile
+                (default from config)
+
+        Raises:
+            ValueError: If the backend or index profile is invalid
+            chromadb.errors.ChromaError: If the name is invalid or the
+                collection exists
+        """
+        backend = embedding_backend or self.config.embedding_backend
+        profile = get_index_profile(index_profile or self.config.index_profile)
+        collection = self.client.create_collection(
+            name=name,
+            configuration=profile.configuration(),
+            embedding_function=self.get_embedding_function(backend),
+            metadata=self._embedding_record(backend),
+        )
+        with self._lock:
+            self._collections[name] = collection
+        return collection
+
+    def get_or_create_collection(self, name: str):
+        """Get a collection, creating it with the configured backend if needed.
+
+        Raises:
+            EmbeddingModelMismatch: If the collection's backend now uses another model
+        """
+        try:
+            return self._open_collection(name)
+        except NotFoundError:
+            pass
+        backend = self.config.embedding_backend
+        return self._cache_collection(
+            self.client.get_or_create_collection(
+                name=name,
+                configuration=get_index_profile(self.config.index_profile).configuration(),
+                embedding_function=self.get_embedding_function(backend),
+                metadata=self._embedding_record(backend),
+            )
+        )
+
+    def list_collections(self):
+        """List all collections."""
+        return self.client.list_collections()
+
+    def get_collection_space(self, name: str) -> Optional[str]:
+        """Distance function of a collection's index, or None if it doesn't exist."""
+        collection = self.get_collection(name)
+        return collection_space(collection) if collection is not None else None
+
+    def set_search_ef(self, name: str, ef_search: int):
+        """Change the HNSW search candidate list size of a collection."""
+        collection = self.get_or_create_collection(name)
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+        with self._lock:
+            self._collections.pop(name, None)
+
+    def default_collection_name(self) -> Optional[str]:
+        """Name of the collection used when none is given.
+
+        Unless set with set_default_collection, this is the first existing
+        collection, looked up once; None if there are no collections.
+        """
+        if self._default_collection is None:
+            collections = self.list_collections()
+            if collections:
+                with self._lock:
+                    if self._default_collection is None:
+                        self._default_collection = collections[0].name
+        return self._default_collection
+
+    def set_default_collection(self, name: str):
+        """Set the collection used when none is given."""
+        with self._lock:
+            self._default_collection = name
+
+    def clear_collection(self, name: str):
+        """Delete all documents in a collection."""
+        collection = self.get_or_create_collection(name)
+        delete_in_pages(collection)
+        self.lexical_index.clear(name)
+        self.source_manifest.clear(name)
+        self.answer_cache.invalidate_collection(name)
+
+    def delete_collection(self, name: str):
+        """Delete a collection."""
+        with self._lock:
+            self._collections.pop(name, None)
+            if self._default_collection == name:
+                self._default_collection = None
+        self.client.delete_collection(name)
+        self.lexical_index.clear(name)
+        self.source_manifest.clear(name)
+        self._lexical_synced.discard(name)
+        self.answer_cache.invalidate_collection(name)
+
+    def sync_lexical_index(self, collection):
+        """Rebuild the lexical index of a collection if it is out of step.
+
+        This covers collections created before the index existed and
+        ingestions that failed part way. Each collection is checked once
+        per process; afterwards the index is kept up to date by the
+        methods changing the collection.
+        """
+        name = collection.name
+        with self._lexical_sync_lock:
+            if name in self._lexical_synced:
+                return
+            if self.lexical_index.count(name) != collection.count():
+                logger.info("Rebuilding the lexical index of %s", name)
+                self.lexical_index.clear(name)
+                for page in iter_collection(collection, ["documents", "metadatas"]):
+                    self.lexical_index.add(
+                        name, page["ids"], page["documents"], page["metadatas"]
+                    )
+            self._lexical_synced.add(name)
+
+    # Documents
+
+    def add_documents(
+        self,
+        documents: List[Dict[str, Any]],
+        collection_name: str,
+        batch_size: int = None,
+        max_workers: int = None,
+        on_progress=None,
+    ) -> Dict[str, int]:
+        """Add document chunks to a collection.
+
+        Chunk ids are derived from each chunk's source and content, so adding
+        a new version of a document only embeds new or changed chunks and
+        removes chunks that are no longer part of it. New chunks are embedded
+        in concurrent, rate-limited batches with retries; adding the same
+        documents again after a failure resumes after the committed batches.
+
+        Args:
+            documents: Chunks as returned by document_processor
+            collection_name: Name of the collection
+            batch_size: Chunks per embedding batch (default from config)
+            max_workers: Batches embedded concurrently (default from config)
+            on_progress: Optional callback receiving progress events, see
+                ingestion.ingest_chunks
+
+        Returns:
+            Dict: {"added": int, "updated": int, "unchanged": int, "deleted": int}
+            chunk counts
+
+        Raises:
+            IngestionError: If some batches failed after all retries
+        """
+        collection = self.get_or_create_collection(collection_name)
+
+        # Group the chunks by document source
+        by_source = {}
+        for doc in documents:
+            source = doc["metadata"].get("source", "unknown")
+            texts, metadatas = by_source.setdefault(source, ([], []))
+            texts.append(doc["text"])
+            metadatas.append({**doc["metadata"], "source": source})
+
+        totals = {"added": 0, "updated": 0, "unchanged": 0, "deleted": 0}
+        try:
+            for source, (texts, metadatas) in by_source.items():
+                # The plan's chunks are what the collection holds for the
+                # source afterwards; the lexical index and manifest follow it
+                plan = plan_source_chunks(collection, source, texts, metadatas)
+                counts = sync_source_chunks(
+                    collection,
+                    self.collection_embedding_function(collection),
+                    plan,
+                    batch_size=batch_size or self.config.batch_size,
+                    max_workers=max_workers or self.config.ingest_workers,
+                    rate_limiter=self.rate_limiter,
+                    on_progress=on_progress,
+                )
+                for key, value in counts.items():
+                    totals[key] += value
+
+                chunks = plan["chunks"]
+                self.lexical_index.sync_source(
+                    collection_name,
+                    source,
+                    list(chunks),
+                    [text for text, _ in chunks.values()],
+                    [metadata for _, metadata in chunks.values()],
+                )
+                self.source_manifest.record(
+                    collection_name, source, list(chunks), [text for text, _ in chunks.values()]
+                )
+        except Exception:
+            # Have the lexical index checked against the collection again
+            self._lexical_synced.discard(collection_name)
+            raise
+        finally:
+            # Even a partial ingestion changes what queries can return
+            self.answer_cache.invalidate_collection(collection_name)
+
+        return totals
+
+    def query(
+        self,
+        query_text: str,
+        collection_name: str,
+        n_results: int = 10,
+        rerank: str = None,
+        hybrid: bool = None,
+    ):
+        """Query a collection for the chunks most relevant to ``query_text``.
+
+        Hybrid queries fuse the vector results with BM25 results from the
+        lexical index (see rerank.fuse_results) and fall back to the BM25
+        results alone when the vector query fails or times out. With
+        reranking, more candidates are fetched and the best ``n_results``
+        after reranking are returned (see rerank.rerank_results).
+
+        Args:
+            rerank: Reranking method; None uses the configured default and
+                "none" disables reranking
+            hybrid: Whether to use the lexical index; None uses the
+                configured default
+        """
+        if rerank is None:
+            rerank = self.config.rerank
+        if rerank not in RERANK_METHODS:
+            rerank = None
+        if hybrid is None:
+            hybrid = self.config.hybrid
+
+        fetch = candidate_count(n_results) if rerank else n_results
+        if hybrid:
+            results = self._hybrid_query(query_text, collection_name, fetch)
+        else:
+            collection = self.get_or_create_collection(collection_name)
+            results = collection.query(query_texts=[query_text], n_results=fetch)
+        if rerank:
+            results = rerank_results(query_text, results, rerank, n_results)
+        return results
+
+    def _hybrid_query(self, query_text: str, collection_name: str, n_results: int):
+        start = time.perf_counter()
+        collection = future = None
+        try:
+            collection = self.get_or_create_collection(collection_name)
+            future = self.query_executor.submit(
+                collection.query, query_texts=[query_text], n_results=n_results
+            )
+        except EmbeddingModelMismatch:
+            raise
+        except Exception:
+            logger.warning("Vector query of %s failed", collection_name, exc_info=True)
+        if collection is not None:
+            self.sync_lexical_index(collection)
+
+        with timed("lexical_search"):
+            lexical = self.lexical_index.search(collection_name, query_text, n_results)
+        if future is None:
+            return fuse_results([lexical], n_results)
+
+        try:
+            vector = future.result(
+                timeout=max(0.0, self.config.query_timeout - (time.perf_counter() - start))
+            )
+        except FutureTimeoutError:
+            logger.warning(
+                "Vector query of %s timed out; using lexical results only", collection_name
+            )
+            record_metric("query_lexical_fallback", time.perf_counter() - start)
+            return fuse_results([lexical], n_results)
+        except Exception:
+            logger.warning(
+                "Vector query of %s failed; using lexical results only",
+                collection_name,
+                exc_info=True,
+            )
+            record_metric("query_lexical_fallback", time.perf_counter() - start)
+            return fuse_results([lexical], n_results)
+        return fuse_results([vector, lexical], n_results)
+
+    def iter_documents(
+        self,
+        collection_name: str,
+        include=("documents", "metadatas"),
+        where: Optional[Dict[str, Any]] = None,
+        page_size: int = COLLECTION_PAGE_SIZE,
+    ):
+        """Iterate over the chunks of a collection in pages, see paging.iter_collection.
+
+        Yields nothing if the collection doesn't exist.
+        """
+        collection = self.get_collection(collection_name)
+        if collection is not None:
+            yield from iter_collection(collection, include, where, page_size)
+
+    def get_all_documents(
+        self, collection_name: str, include=("documents", "metadatas"), where=None
+    ):
+        """Get the ids and the ``include`` fields of all chunks of a collection.
+
+        This holds the whole collection in memory; prefer iter_documents.
+        """
+        results = {"ids": [], **{field: [] for field in include}}
+        for page in self.iter_documents(collection_name, include, where):
+            for field, values in page.items():
+                results[field].extend(values)
+        return results
+
+    def get_document_sources(self, collection_name: str):
+        """Get a dictionary of document sources with their chunk counts.
+
+        Sources are read from the source manifest, which is rebuilt from the
+        collection when its chunk count no longer matches the collection's
+        (e.g. for collections ingested before the manifest existed).
+
+        Returns:
+            Dict: {source_name: {"chunks", "bytes", "ingested_at", "content_hash"}}
+        """
+        collection = self.get_or_create_collection(collection_name)
+        if self.source_manifest.chunk_count(collection_name) != collection.count():
+            logger.info("Rebuilding the source manifest of %s", collection_name)
+            self.source_manifest.rebuild(
+                collection_name,
+                (
+                    chunk
+                    for page in iter_collection(collection, ["documents", "metadatas"])
+                    for chunk in zip(page["ids"], page["documents"], page["metadatas"])
+                ),
+            )
+        return self.source_manifest.sources(collection_name)
+
+    def delete_document(self, source: str, collection_name: str) -> int:
+        """Delete all chunks of a document source.
+
+        Returns:
+            int: Number of chunks deleted
+        """
+        collection = self.get_or_create_collection(collection_name)
+        deleted = delete_in_pages(
+            collection,
+            where={"source": source},
+            on_page=lambda ids: self.lexical_index.delete(collection_name, ids),
+        )
+        if deleted:
+            self.answer_cache.invalidate_collection(collection_name)
+        self.source_manifest.remove(collection_name, source)
+        return deleted
+
+    # Caches
+
+    def _embed_query(self, query_text: str, collection_name: str):
+        # Embed with the collection's model so cached questions are comparable
+        collection = self.get_collection(collection_name)
+        if collection is None:
+            embedding_function = self.embedding_function
+        else:
+            embedding_function = self.collection_embedding_function(collection)
+        return embedding_function.embed_query([query_text])[0]
+
+    def lookup_cached_answer(self, query_text: str, language: str, collection_name: str):
+        """Look up a cached answer for a question similar to ``query_text``.
+
+        Returns:
+            Tuple (answer, similarity) or None, also when the query cannot
+            be embedded
+        """
+        try:
+            embedding = self._embed_query(query_text, collection_name)
+        except Exception:
+            logger.warning("Could not embed the query for the answer cache", exc_info=True)
+            return None
+        return self.answer_cache.lookup(
+            embedding, collection_name, language, self.config.answer_cache_threshold
+        )
+
+    def cache_answer(self, query_text: str, answer: str, language: str, collection_name: str):
+        """Cache the answer generated for ``query_text``, if it can be embedded."""
+        try:
+            embedding = self._embed_query(query_text, collection_name)
+        except Exception:
+            logger.warning("Could not embed the query for the answer cache", exc_info=True)
+            return
+        self.answer_cache.store(embedding, collection_name, language, query_text, answer)
+
+    def embedding_cache_stats(self):
+        """Hit/miss counters of the embedding cache for this process."""
+        return self.embedding_cache.stats()
+
@@ -0,0 +1,301 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+
+# Word characters plus the combining marks of Indic scripts (which \w does
+# not match), ZWNJ and ZWJ; the danda and double danda are punctuation
+TOKEN = re.compile(r"[\w\u0900-\u0963\u0966-\u0dff\u200c\u200d]+")
+
+# BM25 parameters
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+LEXICAL_INDEX_PATH = os.path.join("data", "lexical_index.db")
+
+# SQLite limits the number of bound parameters per statement
+_MAX_PARAMS = 500
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens, keeping Indic words whole."""
+    return TOKEN.findall(unicodedata.normalize("NFC", text).lower())
+
+
+def bm25_idf(document_frequency: int, n_documents: int) -> float:
+    return math.log(1 + (n_documents - document_frequency + 0.5) / (document_frequency + 0.5))
+
+
+def bm25_term_score(tf: int, idf: float, length: int, average_length: float) -> float:
+    norm = BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+    return idf * tf * (BM25_K1 + 1) / (tf + norm)
+
+
+def bm25_scores(query: str, documents: Iterable[str]) -> List[float]:
+    """Score documents against a query with BM25, using the documents as the corpus."""
+    term_counts = [Counter(tokenize(document)) for document in documents]
+    if not term_counts:
+        return []
+    lengths = [sum(counts.values()) for counts in term_counts]
+    average_length = sum(lengths) / len(lengths) or 1.0
+
+    document_frequency: Dict[str, int] = Counter()
+    for counts in term_counts:
+        document_frequency.update(counts.keys())
+
+    scores = [0.0] * len(term_counts)
+    for term in set(tokenize(query)):
+        if term not in document_frequency:
+            continue
+        idf = bm25_idf(document_frequency[term], len(term_counts))
+        for i, counts in enumerate(term_counts):
+            tf = counts.get(term)
+            if tf:
+                scores[i] += bm25_term_score(tf, idf, lengths[i], average_length)
+    return scores
+
+
+class LexicalIndex:
+    """Inverted index of collection chunks stored in SQLite, searched with BM25.
+
+    It mirrors the chunks of the ChromaDB collections (ids, documents and
+    metadatas) so exact terms can be matched, and results returned, without
+    embedding the query.
+    """
+
+    def __init__(self, path=LEXICAL_INDEX_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS chunks (
+                collection TEXT NOT NULL,
+                id TEXT NOT NULL,
+                source TEXT,
+                length INTEGER NOT NULL,
+                document TEXT NOT NULL,
+                metadata TEXT,
+                PRIMARY KEY (collection, id)
+            )
+            """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_chunks_source ON chunks (collection, source)"
+            )
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS postings (
+                collection TEXT NOT NULL,
+                term TEXT NOT NULL,
+                id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (collection, term, id)
+            ) WITHOUT ROWID
+            """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_postings_id ON postings (collection, id)"
+            )
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS collection_stats (
+                collection TEXT PRIMARY KEY,
+                chunks INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            )
+            """
+            )
+
+    def count(self, collection: str) -> int:
+        """Number of chunks indexed for a collection."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks FROM collection_stats WHERE collection = ?", (collection,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def add(
+        self,
+        collection: str,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Optional[Dict[str, Any]]],
+    ):
+        """Index chunks; chunks already indexed under the same id are replaced."""
+        with self._lock:
+            with self._conn:
+                self._delete(collection, ids)
+                self._add(collection, ids, documents, metadatas)
+
+    def delete(self, collection: str, ids: List[str]):
+        """Remove chunks from the index."""
+        with self._lock:
+            with self._conn:
+                self._delete(collection, ids)
+
+    def clear(self, collection: str):
+        """Remove all chunks of a collection from the index."""
+        with self._lock:
+            with self._conn:
+                for table in ("postings", "chunks", "collection_stats"):
+                    self._conn.execute(
+                        f"DELETE FROM {table} WHERE collection = ?", (collection,)
+                    )
+
+    def sync_source(
+        self,
+        collection: str,
+        source: str,
+        ids: List[str],
+        documents: List[str],
+        metadatas: List[Dict[str, Any]],
+    ):
+        """Make the indexed chunks of one source match the given chunks.
+
+        Only chunks whose ids are not indexed yet are tokenized; indexed
+        chunks of the source that are not given are removed and the others
+        get the given metadata.
+        """
+        with self._lock:
+            with self._conn:
+                rows = self._conn.execute(
+                    "SELECT id FROM chunks WHERE collection = ? AND source = ?",
+                    (collection, source),
+                ).fetchall()
+                indexed = {row[0] for row in rows}
+                self._delete(collection, list(indexed - set(ids)))
+
+                self._conn.executemany(
+                    "UPDATE chunks SET metadata = ? WHERE collection = ? AND id = ?",
+                    [
+                        (json.dumps(metadata), collection, chunk_id)
+                        for chunk_id, metadata in zip(ids, metadatas)
+                        if chunk_id in indexed
+                    ],
+                )
+                new = [i for i, chunk_id in enumerate(ids) if chunk_id not in indexed]
+                self._add(
+                    collection,
+                    [ids[i] for i in new],
+                    [documents[i] for i in new],
+                    [metadatas[i] for i in new],
+                )
+
+    def search(self, collection: str, query: str, n_results: int = 10) -> Dict[str, Any]:
+        """Find the chunks of a collection that best match a query with BM25.
+
+        Returns:
+            Results in the shape of a single-query collection query, best
+            first, with "bm25_scores" instead of "distances"
+        """
+        # The connection is shared with writers on ingestion threads; reading
+        # under the lock sees each of their transactions whole
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunks, total_length FROM collection_stats WHERE collection = ?",
+                (collection,),
+            ).fetchone()
+            scores: Dict[str, float] = {}
+            if row and row[0]:
+                n_chunks, total_length = row
+                average_length = total_length / n_chunks or 1.0
+                for term in set(tokenize(query)):
+                    postings = self._conn.execute(
+                        "SELECT p.id, p.tf, c.length FROM postings p "
+                        "JOIN chunks c ON c.collection = p.collection AND c.id = p.id "
+                        "WHERE p.collection = ? AND p.term = ?",
+                        (collection, term),
+                    ).fetchall()
+                    if not postings:
+                        continue
+                    idf = bm25_idf(len(postings), n_chunks)
+                    for chunk_id, tf, length in postings:
+                        scores[chunk_id] = scores.get(chunk_id, 0.0) + bm25_term_score(
+                            tf, idf, length, average_length
+                        )
+
+            best = sorted(scores, key=lambda chunk_id: -scores[chunk_id])[:n_results]
+            chunks = {}
+            for i in range(0, len(best), _MAX_PARAMS):
+                batch = best[i:i + _MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                for chunk_id, document, metadata in self._conn.execute(
+                    f"SELECT id, document, metadata FROM chunks "
+                    f"WHERE collection = ? AND id IN ({placeholders})",
+                    (collection, *batch),
+                ):
+                    chunks[chunk_id] = (document, json.loads(metadata) if metadata else None)
+
+        return {
+            "ids": [best],
+            "documents": [[chunks[chunk_id][0] for chunk_id in best]],
+            "metadatas": [[chunks[chunk_id][1] for chunk_id in best]],
+            "bm25_scores": [[scores[chunk_id] for chunk_id in best]],
+        }
+
+    def _add(self, collection, ids, documents, metadatas):
+        total_length = 0
+        for chunk_id, document, metadata in zip(ids, documents, metadatas):
+            counts = Counter(tokenize(document or ""))
+            length = sum(counts.values())
+            self._conn.execute(
+                "INSERT INTO chunks (collection, id, source, length, document, metadata) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    collection,
+                    chunk_id,
+                    (metadata or {}).get("source"),
+                    length,
+                    document or "",
+                    json.dumps(metadata) if metadata is not None else None,
+                ),
+            )
+            self._conn.executemany(
+                "INSERT INTO postings (collection, term, id, tf) VALUES (?, ?, ?, ?)",
+                [(collection, term, chunk_id, tf) for term, tf in counts.items()],
+            )
+            total_length += length
+        if ids:
+            self._update_stats(collection, len(ids), total_length)
+
+    def _delete(self, collection, ids):
+        chunks = 0
+        total_length = 0
+        for i in range(0, len(ids), _MAX_PARAMS):
+            batch = ids[i:i + _MAX_PARAMS]
+            placeholders = ",".join("?" * len(batch))
+            row = self._conn.execute(
+                f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks "
+                f"WHERE collection = ? AND id IN ({placeholders})",
+                (collection, *batch),
+            ).fetchone()
+            chunks += row[0]
+            total_length += row[1]
+            for table in ("postings", "chunks"):
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE collection = ? AND id IN ({placeholders})",
+                    (collection, *batch),
+                )
+        if chunks:
+            self._update_stats(collection, -chunks, -total_length)
+
+    def _update_stats(self, collection, chunks, total_length):
+        self._conn.execute(
+            "INSERT INTO collection_stats (collection, chunks, total_length) VALUES (?, ?, ?) "
+            "ON CONFLICT (collection) DO UPDATE SET "
+            "chunks = chunks + excluded.chunks, total_length = total_length + excluded.total_length",
+            (collection, chunks, total_length),
+        )
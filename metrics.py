@@ -0,0 +1,71 @@
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+logger = logging.getLogger(__name__)
+
+# Number of recent samples kept in memory per process
+METRICS_HISTORY = 1000
+
+_samples = deque(maxlen=METRICS_HISTORY)
+_lock = threading.Lock()
+
+
+def record_metric(name, value, **tags):
+    """Record one sample of a named metric (latencies are in seconds)."""
+    sample = {"name": name, "value": value, "time": time.time(), **tags}
+    with _lock:
+        _samples.append(sample)
+    logger.info("%s=%.3f %s", name, value, tags or "")
+
+
+@contextmanager
+def timed(name, timings=None, **tags):
+    """Time the enclosed block and record it as metric ``name``.
+
+    If ``timings`` is a dict, the elapsed seconds are also stored in it under
+    ``name`` so callers can report a per-stage breakdown.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if timings is not None:
+            timings[name] = elapsed
+        record_metric(name, elapsed, **tags)
+
+
+def get_metrics(name=None):
+    """Return recorded samples, optionally only those of metric ``name``."""
+    with _lock:
+        samples = list(_samples)
+    if name is None:
+        return samples
+    return [s for s in samples if s["name"] == name]
+
+
+def summarize_metrics():
+    """Summarize recorded samples per metric.
+
+    Returns:
+        Dict: {name: {"count", "mean", "p50", "p95", "max"}}
+    """
+    values = {}
+    for sample in get_metrics():
+        values.setdefault(sample["name"], []).append(sample["value"])
+
+    summary = {}
+    for name, vals in values.items():
+        vals.sort()
+        summary[name] = {
+            "count": len(vals),
+            "mean": sum(vals) / len(vals),
+            "p50": vals[len(vals) // 2],
+            "p95": vals[min(len(vals) - 1, int(len(vals) * 0.95))],
+            "max": vals[-1],
+        }
+    return summary
@@ -1,9 +1,15 @@
 import streamlit as st
 import io
+import threading
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from streamlit.runtime.scriptrunner_utils.script_run_context import SCRIPT_RUN_CONTEXT_ATTR_NAME
 from PIL import Image
 from gemini import (
-    get_response,
+    stream_response,
+    history_from_turn,
     initialize_gen_ai_client,
     create_chat,
     get_image_descrption,
@@ -17,6 +23,8 @@ from session_state import (
 from chat_db import (
     get_chat_sessions,
     get_messages,
+    get_image,
+    has_earlier_messages,
     save_message,
     save_gemini_history,
     update_chat_title,
@@ -30,9 +38,13 @@ from vector_store import (
     query_collection,
     get_all_documents,
     get_default_collection_name,
+    lookup_cached_answer,
+    cache_answer,
 )
+from chat_cache import get_cached_chat, cache_chat
+from metrics import record_metric, timed
 from document_processor import process_document
-from rag import generate_prompt_with_context
+from rag import CONTEXT_TOKEN_BUDGET, generate_prompt_with_context, merge_query_results
 
 # Language configuration
 LANGUAGES = {
@@ -63,7 +75,8 @@ UI_TRANSLATIONS = {
         "delete_chat": "{0} சாட்யை அழி",
         "deleted_chat": "சாட் அழிக்கப்பட்டது: {0}",
         "all_chats_deleted": "அனைத்து சாட்களும் அழிக்கப்பட்டன",
-        "language": "மொழி"
+        "language": "மொழி",
+        "load_earlier": "முந்தைய செய்திகளை ஏற்று"
     },
     "hi": {
         "page_title": "S.A.F.E. चैटबॉट",
@@ -84,7 +97,8 @@ UI_TRANSLATIONS = {
         "delete_chat": "'{0}' चैट हटाएं",
         "deleted_chat": "चैट हटा दी गई: {0}",
         "all_chats_deleted": "सभी चैट हटा दी गईं",
-        "language": "भाषा"
+        "language": "भाषा",
+        "load_earlier": "पुराने संदेश लोड करें"
     },
     "te": {
         "page_title": "S.A.F.E. చాట్‌బాట్",
@@ -105,7 +119,8 @@ UI_TRANSLATIONS = {
         "delete_chat": "'{0}' చాట్‌ను తొలగించండి",
         "deleted_chat": "చాట్ తొలగించబడింది: {0}",
         "all_chats_deleted": "అన్ని చాట్‌లు తొలగించబడ్డాయి",
-        "language": "భాష"
+        "language": "భాష",
+        "load_earlier": "మునుపటి సందేశాలను లోడ్ చేయండి"
     },
     "en": {
         "page_title": "S.A.F.E. Chatbot",
@@ -126,17 +141,24 @@ UI_TRANSLATIONS = {
         "delete_chat": "Delete '{0}' chat",
         "deleted_chat": "Deleted chat: {0}",
         "all_chats_deleted": "All chats deleted",
-        "language": "Language"
+        "language": "Language",
+        "load_earlier": "Load earlier messages"
     }
 }
 
+# Number of messages loaded at a time when opening or scrolling back a chat
+MESSAGE_PAGE_SIZE = 20
+
+# Worker threads for transcription, image description and retrieval
+TURN_WORKERS = 8
+
 # Initialize session state for language if not exists
 if 'language' not in st.session_state:
     st.session_state.language = 'en'  # Default to English
 
-def transcribe_audio_with_groq(audio_file):
+def transcribe_audio_with_groq(audio_file, api_key=None):
     """Transcribe audio using Groq's Whisper API"""
-    API_KEY = st.secrets["groq_api_key"]
+    API_KEY = api_key or st.secrets["groq_api_key"]
     GROQ_ENDPOINT = "https://api.groq.com/openai/v1/audio/transcriptions"
     MODEL_NAME = "whisper-large-v3"
     
@@ -155,6 +177,41 @@ def transcribe_audio_with_groq(audio_file):
         raise Exception(f"Error {response.status_code}: {response.text}")
 
 
+@st.cache_resource
+def get_turn_executor():
+    """Thread pool shared by all sessions for the network calls of a chat turn."""
+    return ThreadPoolExecutor(max_workers=TURN_WORKERS, thread_name_prefix="chat-turn")
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """Submit ``fn`` so it runs with the current Streamlit script context.
+
+    Pool threads are shared by all sessions, so the context is only attached
+    while ``fn`` runs and the thread's previous one is restored after.
+    """
+    ctx = get_script_run_ctx()
+
+    def run():
+        thread = threading.current_thread()
+        previous = getattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+        add_script_run_ctx(thread, ctx)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if previous is None:
+                vars(thread).pop(SCRIPT_RUN_CONTEXT_ATTR_NAME, None)
+            else:
+                setattr(thread, SCRIPT_RUN_CONTEXT_ATTR_NAME, previous)
+
+    return executor.submit(run)
+
+
+def timed_call(stage, timings, fn, *args, **kwargs):
+    """Call ``fn`` and record its duration as turn stage ``stage``."""
+    with timed(stage, timings):
+        return fn(*args, **kwargs)
+
+
 def main():
     """Main function for the chat bot page"""
     # Get current UI translations
@@ -227,7 +284,9 @@ def main():
                     type=button_type,
                 ):
                     set_active_chat(session_id)
-                    st.session_state.messages = get_messages(session_id)
+                    st.session_state.messages = get_messages(
+                        session_id, limit=MESSAGE_PAGE_SIZE
+                    )
                     st.session_state.chat_title = title
                     st.rerun()
             
@@ -284,15 +343,31 @@ def main():
 
     # Only load messages if there's an active chat
     if active_chat_id:
-        session_messages = get_messages(active_chat_id)
-
-        # If there are messages in the database but not in session state, load them
-        if session_messages and not st.session_state.messages:
-            st.session_state.messages = session_messages
+        # If there are no messages in session state, load the latest page
+        if not st.session_state.messages:
+            st.session_state.messages = get_messages(
+                active_chat_id, limit=MESSAGE_PAGE_SIZE
+            )
 
-        # Get or create a chat session with the Gemini model
-        gemini_history = get_gemini_history(active_chat_id)
-        chat = create_chat(genai_client, gemini_history)
+        # Reuse the live chat object unless its history changed since it was built
+        chat = get_cached_chat(active_chat_id)
+        if chat is None:
+            gemini_history = get_gemini_history(active_chat_id)
+            chat = create_chat(genai_client, gemini_history)
+            cache_chat(active_chat_id, chat, gemini_history)
+
+        # Offer to load older messages; only messages read from the database
+        # carry an id, and anything sent in this session is newer than them
+        oldest_id = (
+            st.session_state.messages[0].get("id") if st.session_state.messages else None
+        )
+        if oldest_id and has_earlier_messages(active_chat_id, oldest_id):
+            if st.button(ui["load_earlier"], key="load_earlier"):
+                earlier = get_messages(
+                    active_chat_id, before=oldest_id, limit=MESSAGE_PAGE_SIZE
+                )
+                st.session_state.messages = earlier + st.session_state.messages
+                st.rerun()
 
         # Display messages
         for message in st.session_state.messages:
@@ -300,8 +375,8 @@ def main():
                 st.markdown(message["content"])
                 # Display images if they exist in the message
                 if "images" in message and message["images"]:
-                    for img in message["images"]:
-                        st.image(img, caption="Uploaded Image")
+                    for image_id in message["images"]:
+                        st.image(get_image(image_id), caption="Uploaded Image")
 
         # Auto-update the chat title if it's a new chat with content
         if st.session_state.messages and st.session_state.chat_title == "New Chat":
@@ -324,7 +399,14 @@ def main():
         disabled=st.session_state.processing,
         on_submit=disable_chat_input,
     ):
+        turn_timings = {}
+        turn_start = time.perf_counter()
+        executor = get_turn_executor()
+        current_collection = get_default_collection_name()
+        is_first_turn = not st.session_state.messages
+
         uploaded_images = []
+        audio_files = []
         transcribed_text = ""
 
         # Process uploaded files
@@ -340,16 +422,38 @@ def main():
                     uploaded_images.append(img_bytes.getvalue())
                 
                 elif file_type == 'audio':
-                    # Handle audio files - transcribe them
-                    with st.spinner(ui["transcribing"]):
-                        try:
-                            audio_text = transcribe_audio_with_groq(file)
-                            if transcribed_text:
-                                transcribed_text += "\n\n" + audio_text
-                            else:
-                                transcribed_text = audio_text
-                        except Exception as e:
-                            st.error(ui["transcription_error"].format(str(e)))
+                    audio_files.append(file)
+
+        # The image description only depends on the images, so start it now and
+        # let it run alongside transcription and the text-only retrieval
+        description_future = None
+        if uploaded_images and current_collection and (getattr(prompt, "text", "") or audio_files):
+            description_future = submit_with_context(
+                executor,
+                timed_call,
+                "turn_image_description",
+                turn_timings,
+                get_image_descrption,
+                [io.BytesIO(img) for img in uploaded_images],
+            )
+
+        # Handle audio files - transcribe them in parallel, keeping upload order
+        if audio_files:
+            groq_api_key = st.secrets["groq_api_key"]
+            with st.spinner(ui["transcribing"]), timed("turn_transcription", turn_timings):
+                audio_futures = [
+                    executor.submit(transcribe_audio_with_groq, file, groq_api_key)
+                    for file in audio_files
+                ]
+                for future in audio_futures:
+                    try:
+                        audio_text = future.result()
+                        if transcribed_text:
+                            transcribed_text += "\n\n" + audio_text
+                        else:
+                            transcribed_text = audio_text
+                    except Exception as e:
+                        st.error(ui["transcription_error"].format(str(e)))
 
         # Add user message to chat history with images
         user_content = prompt.text if hasattr(prompt, "text") else ""
@@ -361,19 +465,45 @@ def main():
             else:
                 user_content = ui["transcribed_audio"].format(transcribed_text)
 
+        # A chat's first question without images can be answered from the
+        # semantic answer cache; follow-ups depend on the conversation so far
+        answer_cacheable = bool(
+            is_first_turn and not uploaded_images and user_content and current_collection
+        )
+        cached_answer = None
+        if answer_cacheable:
+            with timed("turn_answer_cache_lookup", turn_timings):
+                cached_answer = lookup_cached_answer(
+                    user_content, st.session_state.language, current_collection
+                )
+
+        # Start retrieval on the text alone while the user message is saved
+        text_results_future = None
+        if user_content and current_collection and cached_answer is None:
+            text_results_future = submit_with_context(
+                executor,
+                timed_call,
+                "turn_text_retrieval",
+                turn_timings,
+                query_collection,
+                user_content,
+                n_results=100,
+                collection_name=current_collection,
+            )
+
         # Create a new chat if none is active
         if not st.session_state.active_chat_id:
             st.session_state.active_chat_id = create_new_chat()
             chat = create_chat(genai_client)
 
         # Save to database
-        save_message(
+        image_ids = save_message(
             st.session_state.active_chat_id, "user", user_content, uploaded_images
         )
 
         # Update session state
         st.session_state.messages.append(
-            {"role": "user", "content": user_content, "images": uploaded_images}
+            {"role": "user", "content": user_content, "images": image_ids}
         )
 
         # Display user message
@@ -384,65 +514,97 @@ def main():
                 for img in uploaded_images:
                     st.image(img, caption="Uploaded Image")
 
-        # Get AI response with RAG
-        with st.spinner(ui["searching"]):
-            current_collection = get_default_collection_name()
-
-            if user_content and current_collection:
-                user_query = user_content
-                if hasattr(prompt, "files") and prompt.files:
-                    image_files = [f for f in prompt.files if f.type.split('/')[0] == 'image']
-                    if image_files:
-                        image_descriptions = get_image_descrption(image_files)
+        # Build the prompt, with RAG context when a collection is available
+        if cached_answer is None:
+            with st.spinner(ui["searching"]):
+                if text_results_future is not None:
+                    user_query = user_content
+                    query_results = text_results_future.result()
+
+                    # Refine the retrieval with the image descriptions and merge it
+                    # with the text-only results
+                    if description_future is not None:
+                        image_descriptions = description_future.result()
                         user_query += "\n" + image_descriptions
-
-                query_results = query_collection(user_query, n_results=100)
-                enhanced_prompt = generate_prompt_with_context(user_query, query_results)
-
-                class EnhancedPrompt:
-                    def __init__(self, text, files=None):
-                        self.text = text
-                        self.files = files
-
-                image_files = [f for f in prompt.files if f.type.split('/')[0] == 'image'] if hasattr(prompt, "files") else None
-                rag_prompt = EnhancedPrompt(enhanced_prompt, image_files)
-                ai_response, gemini_history = get_response(chat, rag_prompt)
-            else:
-                if hasattr(prompt, "files") and prompt.files:
-                    class FilteredPrompt:
+                        with timed("turn_refined_retrieval", turn_timings):
+                            refined_results = query_collection(
+                                user_query, n_results=100, collection_name=current_collection
+                            )
+                        query_results = merge_query_results(
+                            refined_results, query_results, n_results=100
+                        )
+
+                    context_stats = {}
+                    enhanced_prompt = generate_prompt_with_context(
+                        user_query,
+                        query_results,
+                        token_budget=st.secrets.get("context_token_budget", CONTEXT_TOKEN_BUDGET),
+                        stats=context_stats,
+                    )
+                    record_metric("context_tokens_used", context_stats["tokens_used"])
+                    record_metric("context_tokens_dropped", context_stats["tokens_dropped"])
+
+                    class EnhancedPrompt:
                         def __init__(self, text, files=None):
                             self.text = text
                             self.files = files
+
+                    image_files = [f for f in prompt.files if f.type.split('/')[0] == 'image'] if hasattr(prompt, "files") else None
+                    response_prompt = EnhancedPrompt(enhanced_prompt, image_files)
+                else:
+                    if hasattr(prompt, "files") and prompt.files:
+                        class FilteredPrompt:
+                            def __init__(self, text, files=None):
+                                self.text = text
+                                self.files = files
                     
-                    image_files = [f for f in prompt.files if f.type.split('/')[0] == 'image']
-                    text_content = prompt.text if hasattr(prompt, "text") and prompt.text else ""
+                        image_files = [f for f in prompt.files if f.type.split('/')[0] == 'image']
+                        text_content = prompt.text if hasattr(prompt, "text") and prompt.text else ""
                     
-                    if transcribed_text and not text_content:
-                        text_content = ui["transcribed_audio"].format(transcribed_text)
-                    elif transcribed_text:
-                        if ui["transcribed_audio"].format("").strip() not in text_content:
-                            text_content += f"\n\n{ui['transcribed_audio'].format(transcribed_text)}"
+                        if transcribed_text and not text_content:
+                            text_content = ui["transcribed_audio"].format(transcribed_text)
+                        elif transcribed_text:
+                            if ui["transcribed_audio"].format("").strip() not in text_content:
+                                text_content += f"\n\n{ui['transcribed_audio'].format(transcribed_text)}"
                     
-                    if not text_content and image_files:
-                        text_content = ui["analyze_image"]
+                        if not text_content and image_files:
+                            text_content = ui["analyze_image"]
                         
-                    filtered_prompt = FilteredPrompt(text_content, image_files)
-                    ai_response, gemini_history = get_response(chat, filtered_prompt)
-                else:
-                    if not user_content:
-                        user_content = "Hello"
-                    ai_response, gemini_history = get_response(chat, prompt)
-
-        # Save Gemini history to database
+                        response_prompt = FilteredPrompt(text_content, image_files)
+                    else:
+                        if not user_content:
+                            user_content = "Hello"
+                        response_prompt = prompt
+
+        turn_timings["turn_preparation"] = time.perf_counter() - turn_start
+
+        if cached_answer is not None:
+            # Serve the cached answer and record the turn as if Gemini gave it
+            ai_response, _ = cached_answer
+            with st.chat_message("assistant"):
+                st.markdown(ai_response)
+            gemini_history = history_from_turn(user_content, ai_response)
+        else:
+            # Stream the AI response as it is generated
+            with st.chat_message("assistant"), timed("turn_generation", turn_timings):
+                ai_response = st.write_stream(stream_response(chat, response_prompt))
+            gemini_history = chat.get_history()
+
+            if answer_cacheable:
+                cache_answer(
+                    user_content, ai_response, st.session_state.language, current_collection
+                )
+
+        turn_timings["turn_total"] = time.perf_counter() - turn_start
+        record_metric("turn_total", turn_timings["turn_total"])
+        st.session_state.last_turn_timings = turn_timings
+
+        # Save Gemini history to database once the response has completed
         save_gemini_history(st.session_state.active_chat_id, gemini_history)
 
         # Save AI response to database
         save_message(st.session_state.active_chat_id, "assistant", ai_response)
 
-        # Display AI response
-        with st.chat_message("assistant"):
-            st.markdown(ai_response)
-
         # Add AI response to chat history
         st.session_state.messages.append({"role": "assistant", "content": ai_response})
 
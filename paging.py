@@ -0,0 +1,77 @@
+import logging
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+# Chunks read or deleted per request to ChromaDB
+COLLECTION_PAGE_SIZE = 1000
+
+
+def iter_collection(
+    collection,
+    include: Iterable[str] = (),
+    where: Optional[Dict[str, Any]] = None,
+    page_size: int = COLLECTION_PAGE_SIZE,
+) -> Iterator[Dict[str, List]]:
+    """Iterate over the chunks of a collection in pages.
+
+    Only ids and the ``include`` fields ("documents", "metadatas",
+    "embeddings") are read, so memory use is bounded by the page size
+    whatever the size of the collection. The collection should not change
+    during the iteration; use delete_in_pages to delete chunks.
+
+    Args:
+        collection: ChromaDB collection
+        include: Fields to read besides the ids
+        where: Optional metadata filter
+        page_size: Chunks per page
+
+    Yields:
+        Dict with "ids" and a list per included field
+    """
+    include = list(include)
+    offset = 0
+    while True:
+        page = collection.get(where=where, include=include, limit=page_size, offset=offset)
+        ids = page["ids"]
+        if not ids:
+            return
+        yield {"ids": ids, **{field: page[field] for field in include}}
+        if len(ids) < page_size:
+            return
+        offset += len(ids)
+
+
+def delete_in_pages(
+    collection,
+    where: Optional[Dict[str, Any]] = None,
+    page_size: int = COLLECTION_PAGE_SIZE,
+    on_page: Optional[Callable[[List[str]], None]] = None,
+) -> int:
+    """Delete the chunks of a collection, or those matching ``where``, a page at a time.
+
+    Each page is read back after the delete; ``on_page`` only gets the ids
+    that are gone. Stops early if none of a page's chunks were deleted
+    (e.g. re-added concurrently), so it always terminates.
+
+    Args:
+        on_page: Optional callback receiving the ids deleted from each page
+
+    Returns:
+        int: Number of chunks deleted
+    """
+    deleted = 0
+    while True:
+        ids = collection.get(where=where, include=[], limit=page_size)["ids"]
+        if not ids:
+            return deleted
+        collection.delete(ids=ids)
+        remaining = set(collection.get(ids=ids, include=[])["ids"])
+        gone = [i for i in ids if i not in remaining]
+        if not gone:
+            logger.warning("Chunks of %s were not deleted: %s...", collection.name, ids[:3])
+            return deleted
+        if on_page is not None:
+            on_page(gone)
+        deleted += len(gone)
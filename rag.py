@@ -1,6 +1,18 @@
+import math
+import re
 import streamlit as st
 from vector_store import query_collection
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+
+
+# Default token budget for the retrieved context in a prompt
+CONTEXT_TOKEN_BUDGET = 4000
+
+# Chunks whose word shingles overlap at least this much (Jaccard) are
+# near-duplicates; only the most relevant one is kept
+DUPLICATE_SIMILARITY = 0.8
+
+SHINGLE_SIZE = 5
 
 
 def format_context(results: Dict[str, Any]) -> str:
@@ -20,9 +32,182 @@ def format_context(results: Dict[str, Any]) -> str:
     return "\n".join(context_parts)
 
 
-def generate_prompt_with_context(query: str, results: Dict[str, Any]) -> str:
-    """Generate a prompt that includes context for the AI."""
-    context = format_context(results)
+def merge_query_results(
+    first: Dict[str, Any], second: Dict[str, Any], n_results: int
+) -> Dict[str, Any]:
+    """Merge two single-query results, keeping the closest unique chunks.
+
+    Both inputs have the shape returned by ``query_collection`` for one query
+    text. Chunks found by both are kept once with their better score, and the
+    best ``n_results`` are returned in the same shape. Results are compared
+    by rerank score when both were reranked, otherwise by distance.
+    """
+    reranked = all(results and "rerank_scores" in results for results in (first, second))
+
+    merged = {}
+    for results in (first, second):
+        if not results or not results["ids"]:
+            continue
+        scores = results["rerank_scores"][0] if reranked else results["distances"][0]
+        for chunk_id, doc, metadata, distance, score in zip(
+            results["ids"][0],
+            results["documents"][0],
+            results["metadatas"][0],
+            results["distances"][0],
+            scores,
+        ):
+            # Lower is better: distances as they are, rerank scores negated
+            key = -score if reranked else score
+            if chunk_id not in merged or key < merged[chunk_id][3]:
+                merged[chunk_id] = (doc, metadata, distance, key)
+
+    ranked = sorted(merged.items(), key=lambda item: item[1][3])[:n_results]
+    merged_results = {
+        "ids": [[chunk_id for chunk_id, _ in ranked]],
+        "documents": [[doc for _, (doc, _, _, _) in ranked]],
+        "metadatas": [[metadata for _, (_, metadata, _, _) in ranked]],
+        "distances": [[distance for _, (_, _, distance, _) in ranked]],
+    }
+    if reranked:
+        merged_results["rerank_scores"] = [[-key for _, (_, _, _, key) in ranked]]
+    return merged_results
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the model tokens of a text (about four UTF-8 bytes per token).
+
+    Counting bytes rather than characters accounts for Indic scripts
+    taking more tokens per character than English.
+    """
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+
+def _shingles(text: str):
+    words = re.findall(r"\S+", text.lower())
+    if len(words) < SHINGLE_SIZE:
+        return {" ".join(words)}
+    return {
+        hash(" ".join(words[i:i + SHINGLE_SIZE]))
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+
+
+def _join_overlapping(first: str, second: str) -> str:
+    """Join two consecutive chunks, writing the text they share only once."""
+    probe = second[:50]
+    start = first.rfind(probe) if probe else -1
+    while start != -1:
+        if second.startswith(first[start:]):
+            return first + second[len(first) - start:]
+        start = first.rfind(probe, 0, start)
+    return first + "\n" + second
+
+
+def build_context(
+    results: Dict[str, Any],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    stats: Optional[Dict[str, int]] = None,
+) -> str:
+    """Assemble retrieved chunks into a context that fits a token budget.
+
+    Chunks are taken in the order given, most relevant first (query
+    results are ordered by distance or rerank score). Near-duplicates of a more
+    relevant chunk are dropped, and chunks that do not fit in the budget
+    are skipped. The chunks kept are then merged with their neighbours
+    from the same source (consecutive chunk indices) into passages, which
+    are ordered by their most relevant chunk.
+
+    Args:
+        results: Single-query results as returned by query_collection
+        token_budget: Maximum estimated tokens of the context
+        stats: Optional dict that receives "chunks_used", "duplicates",
+            "chunks_dropped", "tokens_used" and "tokens_dropped"
+
+    Returns:
+        str: The context, empty if there are no results
+    """
+    counts = {
+        "chunks_used": 0,
+        "duplicates": 0,
+        "chunks_dropped": 0,
+        "tokens_used": 0,
+        "tokens_dropped": 0,
+    }
+    if stats is not None:
+        stats.update(counts)
+    if not results or not results["documents"] or not results["documents"][0]:
+        return ""
+
+    ranked = list(zip(results["documents"][0], results["metadatas"][0]))
+
+    selected = []  # (rank, doc, metadata)
+    kept_shingles = []
+    used = 0
+    for rank, (doc, metadata) in enumerate(ranked):
+        shingles = _shingles(doc)
+        if any(
+            len(shingles & other) >= DUPLICATE_SIMILARITY * len(shingles | other)
+            for other in kept_shingles
+        ):
+            counts["duplicates"] += 1
+            continue
+
+        source = (metadata or {}).get("source", "Unknown source")
+        cost = estimate_tokens(f"[Document: {source}]\n{doc}\n")
+        if used + cost > token_budget:
+            counts["chunks_dropped"] += 1
+            counts["tokens_dropped"] += cost
+            continue
+
+        used += cost
+        kept_shingles.append(shingles)
+        selected.append((rank, doc, metadata or {}))
+
+    # Merge runs of consecutive chunks of the same source into passages
+    by_position = sorted(
+        selected,
+        key=lambda item: (str(item[2].get("source", "")), item[2].get("chunk", -1), item[0]),
+    )
+    passages = []  # [best rank, source, text, last chunk index]
+    for rank, doc, metadata in by_position:
+        source = metadata.get("source", "Unknown source")
+        chunk = metadata.get("chunk")
+        last = passages[-1] if passages else None
+        if (
+            last is not None
+            and chunk is not None
+            and last[3] is not None
+            and last[1] == source
+            and chunk == last[3] + 1
+        ):
+            last[0] = min(last[0], rank)
+            last[2] = _join_overlapping(last[2], doc)
+            last[3] = chunk
+        else:
+            passages.append([rank, source, doc, chunk])
+
+    passages.sort(key=lambda passage: passage[0])
+    context = "\n".join(f"[Document: {source}]\n{text}\n" for _, source, text, _ in passages)
+
+    counts["chunks_used"] = len(selected)
+    counts["tokens_used"] = estimate_tokens(context)
+    if stats is not None:
+        stats.update(counts)
+    return context
+
+
+def generate_prompt_with_context(
+    query: str,
+    results: Dict[str, Any],
+    token_budget: int = CONTEXT_TOKEN_BUDGET,
+    stats: Optional[Dict[str, int]] = None,
+) -> str:
+    """Generate a prompt that includes context for the AI.
+
+    The context is limited to ``token_budget`` estimated tokens, see
+    build_context, which also describes ``stats``.
+    """
+    context = build_context(results, token_budget, stats)
 
     if not context:
         return query
@@ -0,0 +1,138 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from lexical import bm25_scores
+from metrics import record_metric
+
+
+logger = logging.getLogger(__name__)
+
+# Candidates fetched per requested result when reranking, and their cap
+RERANK_OVERFETCH = 4
+RERANK_MAX_CANDIDATES = 200
+
+# Multilingual MS MARCO cross-encoder (covers Hindi, Tamil and Telugu);
+# needs the optional sentence-transformers package
+CROSS_ENCODER_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+
+# Reciprocal rank fusion constant
+RRF_K = 60
+
+RERANK_METHODS = ("bm25", "cross-encoder")
+
+_cross_encoder = None
+_cross_encoder_lock = threading.Lock()
+
+
+def candidate_count(n_results: int) -> int:
+    """Number of candidates to fetch for ``n_results`` reranked results."""
+    return max(n_results, min(n_results * RERANK_OVERFETCH, RERANK_MAX_CANDIDATES))
+
+
+def get_cross_encoder():
+    """Load the cross-encoder once per process.
+
+    Raises:
+        ImportError: If sentence-transformers is not installed
+    """
+    global _cross_encoder
+    with _cross_encoder_lock:
+        if _cross_encoder is None:
+            from sentence_transformers import CrossEncoder
+
+            _cross_encoder = CrossEncoder(CROSS_ENCODER_MODEL, device="cpu")
+        return _cross_encoder
+
+
+def _bm25_fusion_scores(query: str, documents: List[str]) -> List[float]:
+    """Fuse the vector ranking (input order) with a BM25 ranking of the candidates."""
+    lexical = bm25_scores(query, documents)
+    lexical_rank = {
+        i: rank for rank, i in enumerate(sorted(range(len(documents)), key=lambda i: -lexical[i]))
+    }
+    return [
+        1 / (RRF_K + i + 1) + (1 / (RRF_K + lexical_rank[i] + 1) if lexical[i] else 0)
+        for i in range(len(documents))
+    ]
+
+
+def _cross_encoder_scores(query: str, documents: List[str]) -> List[float]:
+    model = get_cross_encoder()
+    return [float(score) for score in model.predict([(query, doc) for doc in documents])]
+
+
+def fuse_results(results_list: List[Dict[str, Any]], n_results: int) -> Dict[str, Any]:
+    """Combine the rankings of several single-query results by reciprocal rank fusion.
+
+    Returns:
+        Results in the same shape, best first, with the fused scores as
+        "rerank_scores"; "distances" holds each chunk's distance from the
+        first input that has one, or None (e.g. for lexical-only matches)
+    """
+    fused = {}  # chunk id -> [score, document, metadata, distance]
+    for results in results_list:
+        if not results or not results["ids"] or not results["ids"][0]:
+            continue
+        distances = results.get("distances")
+        distances = distances[0] if distances else [None] * len(results["ids"][0])
+        for rank, (chunk_id, doc, metadata, distance) in enumerate(zip(
+            results["ids"][0], results["documents"][0], results["metadatas"][0], distances
+        )):
+            entry = fused.setdefault(chunk_id, [0.0, doc, metadata, None])
+            entry[0] += 1 / (RRF_K + rank + 1)
+            if entry[3] is None:
+                entry[3] = distance
+
+    ranked = sorted(fused.items(), key=lambda item: -item[1][0])[:n_results]
+    return {
+        "ids": [[chunk_id for chunk_id, _ in ranked]],
+        "documents": [[entry[1] for _, entry in ranked]],
+        "metadatas": [[entry[2] for _, entry in ranked]],
+        "distances": [[entry[3] for _, entry in ranked]],
+        "rerank_scores": [[entry[0] for _, entry in ranked]],
+    }
+
+
+def rerank_results(
+    query: str, results: Dict[str, Any], method: str, n_results: int
+) -> Dict[str, Any]:
+    """Rerank single-query results and keep the best ``n_results``.
+
+    Args:
+        query: The query text
+        results: Results as returned by a collection query, best first
+        method: One of RERANK_METHODS; "cross-encoder" falls back to "bm25"
+            when sentence-transformers is not installed
+        n_results: Results to keep
+
+    Returns:
+        Results in the same shape, best first, with a "rerank_scores" entry
+    """
+    if not results or not results["ids"] or not results["ids"][0]:
+        return results
+    if method not in RERANK_METHODS:
+        raise ValueError(f"Unknown reranking method: {method}")
+
+    documents = results["documents"][0]
+    start = time.perf_counter()
+    scores: Optional[List[float]] = None
+    if method == "cross-encoder":
+        try:
+            scores = _cross_encoder_scores(query, documents)
+        except ImportError:
+            logger.warning("sentence-transformers is not installed; reranking with BM25")
+            method = "bm25"
+    if scores is None:
+        scores = _bm25_fusion_scores(query, documents)
+    record_metric(f"rerank_{method}", time.perf_counter() - start)
+
+    order = sorted(range(len(documents)), key=lambda i: -scores[i])[:n_results]
+    reranked = {
+        key: [[values[0][i] for i in order]]
+        for key, values in results.items()
+        if key in ("ids", "documents", "metadatas", "distances") and values
+    }
+    reranked["rerank_scores"] = [[scores[i] for i in order]]
+    return reranked
@@ -0,0 +1,158 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List
+
+
+SOURCE_MANIFEST_PATH = os.path.join("data", "source_manifest.db")
+
+
+def content_hash(chunk_ids: Iterable[str]) -> str:
+    """Hash identifying the content of a document from its chunk ids.
+
+    Chunk ids are hashes of the chunks' content (see ingestion.chunk_id), so
+    this changes exactly when the document's chunks do.
+    """
+    digest = hashlib.sha256()
+    for chunk_id in sorted(set(chunk_ids)):
+        digest.update(chunk_id.encode("utf-8"))
+    return digest.hexdigest()
+
+
+class SourceManifest:
+    """Per-collection list of document sources stored in SQLite.
+
+    Each source has its chunk count, the UTF-8 size of its chunks, the time
+    it was last ingested and a content hash, so sources can be listed
+    without reading the collection.
+    """
+
+    def __init__(self, path=SOURCE_MANIFEST_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                """
+            CREATE TABLE IF NOT EXISTS sources (
+                collection TEXT NOT NULL,
+                source TEXT NOT NULL,
+                chunks INTEGER NOT NULL,
+                bytes INTEGER NOT NULL,
+                ingested_at REAL,
+                content_hash TEXT NOT NULL,
+                PRIMARY KEY (collection, source)
+            )
+            """
+            )
+
+    def sources(self, collection: str) -> Dict[str, Dict[str, Any]]:
+        """Sources of a collection.
+
+        Returns:
+            Dict: {source: {"chunks", "bytes", "ingested_at", "content_hash"}};
+            ingested_at is None for sources recorded by ``rebuild``
+        """
+        # The connection is shared with writers on ingestion threads
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT source, chunks, bytes, ingested_at, content_hash FROM sources "
+                "WHERE collection = ? AND source != '' ORDER BY source",
+                (collection,),
+            ).fetchall()
+        return {
+            source: {
+                "chunks": chunks,
+                "bytes": size,
+                "ingested_at": ingested_at,
+                "content_hash": digest,
+            }
+            for source, chunks, size, ingested_at, digest in rows
+        }
+
+    def chunk_count(self, collection: str) -> int:
+        """Total chunks of the sources recorded for a collection."""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(chunks), 0) FROM sources WHERE collection = ?", (collection,)
+            ).fetchone()[0]
+
+    def record(self, collection: str, source: str, chunk_ids: List[str], texts: List[str]):
+        """Record the chunks a source has after an ingestion."""
+        chunks = dict(zip(chunk_ids, texts))
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO sources "
+                    "(collection, source, chunks, bytes, ingested_at, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        collection,
+                        source,
+                        len(chunks),
+                        sum(len(text.encode("utf-8")) for text in chunks.values()),
+                        time.time(),
+                        content_hash(chunks),
+                    ),
+                )
+
+    def remove(self, collection: str, source: str):
+        """Remove a source from a collection's manifest."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute(
+                    "DELETE FROM sources WHERE collection = ? AND source = ?", (collection, source)
+                )
+
+    def clear(self, collection: str):
+        """Remove all sources of a collection."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM sources WHERE collection = ?", (collection,))
+
+    def rebuild(self, collection: str, chunks: Iterable[tuple]):
+        """Replace a collection's manifest with one computed from its chunks.
+
+        Sources whose content did not change keep their ingestion time.
+
+        Args:
+            chunks: ``(chunk_id, document, metadata)`` of every chunk
+        """
+        by_source: Dict[str, List] = {}
+        for chunk_id, document, metadata in chunks:
+            # Chunks without a source are counted under "", which is not listed
+            source = (metadata or {}).get("source") or ""
+            entry = by_source.setdefault(source, [[], 0])
+            entry[0].append(chunk_id)
+            entry[1] += len((document or "").encode("utf-8"))
+
+        with self._lock:
+            with self._conn:
+                known = {
+                    (source, digest): ingested_at
+                    for source, digest, ingested_at in self._conn.execute(
+                        "SELECT source, content_hash, ingested_at FROM sources "
+                        "WHERE collection = ?",
+                        (collection,),
+                    )
+                }
+                self._conn.execute("DELETE FROM sources WHERE collection = ?", (collection,))
+                rows = []
+                for source, (ids, size) in by_source.items():
+                    digest = content_hash(ids)
+                    rows.append(
+                        (collection, source, len(ids), size, known.get((source, digest)), digest)
+                    )
+                self._conn.executemany(
+                    "INSERT INTO sources "
+                    "(collection, source, chunks, bytes, ingested_at, content_hash) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
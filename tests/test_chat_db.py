@@ -0,0 +1,55 @@
+import json
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_db import MIGRATIONS, ConnectionPool, get_schema_version, run_migrations  # noqa: E402
+
+
+def _baseline_db(path):
+    """Create a database as the app did before migrations, with one deleted chat."""
+    conn = sqlite3.connect(path)
+    MIGRATIONS[0](conn.cursor())
+    history = json.dumps([{"role": "user", "parts": ["hi"]}, {"role": "model", "parts": ["hello"]}])
+    conn.execute("INSERT INTO chat_sessions VALUES (1, 'kept', 't', 't'), (2, 'deleted', 't', 't')")
+    for session_id in (1, 2):
+        conn.execute(
+            "INSERT INTO messages (session_id, role, content, timestamp) VALUES (?, 'user', 'hi', 't')",
+            (session_id,),
+        )
+        conn.execute("INSERT INTO gemini_history VALUES (?, ?)", (session_id, history))
+    # Deleted with foreign keys off, so its rows stay behind
+    conn.execute("DELETE FROM chat_sessions WHERE id = 2")
+    conn.commit()
+    conn.close()
+
+
+def test_migrations_drop_rows_of_deleted_chats(tmp_path):
+    path = str(tmp_path / "chats.db")
+    _baseline_db(path)
+
+    conn = ConnectionPool(path).acquire()
+    run_migrations(conn)
+
+    assert get_schema_version(conn) == len(MIGRATIONS)
+    assert [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM gemini_turns")] == [1]
+    assert [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM messages")] == [1]
+    assert conn.execute("PRAGMA foreign_key_check").fetchall() == []
+
+
+def test_history_of_deleted_chat_is_not_copied(tmp_path):
+    path = str(tmp_path / "chats.db")
+    _baseline_db(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA foreign_keys=ON")
+    run_migrations(conn, target=len(MIGRATIONS) - 1)
+    # Orphaned history left by an earlier run, as if cleaned up before it
+    conn.execute("PRAGMA foreign_keys=OFF")
+    conn.execute("INSERT INTO gemini_history SELECT 3, history_data FROM gemini_history")
+    conn.execute("PRAGMA foreign_keys=ON")
+
+    MIGRATIONS[-1](conn.cursor())
+
+    assert [row[0] for row in conn.execute("SELECT DISTINCT session_id FROM gemini_turns")] == [1]
@@ -0,0 +1,22 @@
+import os
+import sys
+import unicodedata
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chunking import CHUNK_SIZE, get_chunker  # noqa: E402
+
+
+def test_long_virama_run_is_cut_at_window_end():
+    # One unbroken cluster: no cut avoids splitting it, so windows stay full
+    text = "क्" * 2000
+    chunks = get_chunker("recursive").chunk(text)
+    assert len(chunks) == 4
+    assert all(len(chunk) == CHUNK_SIZE for chunk in chunks)
+
+
+def test_long_word_is_not_cut_inside_a_cluster():
+    text = "नमस्ते" * 500
+    for _, end in list(get_chunker("fixed").spans(text))[:-1]:
+        assert unicodedata.combining(text[end - 1]) != 9
+        assert unicodedata.category(text[end]) not in ("Mn", "Mc")
@@ -0,0 +1,118 @@
+import logging
+import shutil
+import threading
+from typing import Any, Dict, List, Tuple
+
+from document_processor import process_paths
+from ingestion import IngestionError
+
+
+logger = logging.getLogger(__name__)
+
+
+class UploadJob:
+    """Adds uploaded documents to a collection on a background thread.
+
+    The upload page starts a job and polls ``progress``, ``status`` and
+    ``done`` on its reruns, so it stays responsive while documents are
+    extracted in worker processes and embedded. The thread has no Streamlit
+    script context, so nothing here calls Streamlit.
+
+    Args:
+        knowledge_base: KnowledgeBase the documents are added to
+        collection_name: Target collection
+        files: (path, source) of each spooled upload
+        upload_dir: Directory of the spooled uploads, removed when done
+        strategy: Chunking strategy (see chunking.CHUNKERS)
+        results: Results recorded before the job started (e.g. bad archives)
+    """
+
+    def __init__(
+        self,
+        knowledge_base,
+        collection_name: str,
+        files: List[Tuple[str, str]],
+        upload_dir: str,
+        strategy: str = None,
+        results: List[Dict[str, Any]] = None,
+    ):
+        self.knowledge_base = knowledge_base
+        self.collection_name = collection_name
+        self.files = files
+        self.upload_dir = upload_dir
+        self.strategy = strategy
+        self._results = list(results or [])
+        self._progress = 0.0
+        self._status = "Processing files..."
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="upload-job", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    @property
+    def done(self) -> bool:
+        return not self._thread.is_alive()
+
+    @property
+    def progress(self) -> float:
+        """Share of the files processed, between 0 and 1."""
+        with self._lock:
+            return self._progress
+
+    @property
+    def status(self) -> str:
+        with self._lock:
+            return self._status
+
+    @property
+    def results(self) -> List[Dict[str, Any]]:
+        """One row per file: "file", "status" and, once added, the chunk counts."""
+        with self._lock:
+            return list(self._results)
+
+    def _set(self, status=None, progress=None, result=None):
+        with self._lock:
+            if status is not None:
+                self._status = status
+            if progress is not None:
+                self._progress = progress
+            if result is not None:
+                self._results.append(result)
+
+    def _run(self):
+        try:
+            # Chunks of each file are embedded as soon as it is extracted,
+            # while the remaining files are still being processed
+            for finished, (source, documents, error) in enumerate(
+                process_paths(self.files, strategy=self.strategy), start=1
+            ):
+                self._set(progress=finished / len(self.files))
+                if error is not None or not documents:
+                    self._set(result={"file": source, "status": f"❌ {error or 'No text found'}"})
+                    continue
+
+                def show_progress(event, source=source, finished=finished):
+                    self._set(
+                        status=f"{source}: embedded {event['done']} of {event['total']} chunks "
+                        f"(batch {event['batch']}/{event['batches']}) "
+                        f"- file {finished} of {len(self.files)}"
+                    )
+
+                self._set(status=f"{source}: adding to knowledge base...")
+                try:
+                    counts = self.knowledge_base.add_documents(
+                        documents, self.collection_name, on_progress=show_progress
+                    )
+                    result = {"file": source, "status": "✅ Added", "chunks": len(documents), **counts}
+                except IngestionError as e:
+                    result = {
+                        "file": source, "status": f"❌ {e}", "chunks": len(documents), "added": e.added
+                    }
+                self._set(result=result)
+        except Exception as e:
+            logger.exception("Upload job failed")
+            self._set(result={"file": "", "status": f"❌ {e}"})
+        finally:
+            shutil.rmtree(self.upload_dir, ignore_errors=True)
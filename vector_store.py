@@ -1,42 +1,66 @@
-import os
-import chromadb
+"""Streamlit adapter for the knowledge base.
+
+Shares one KnowledgeBase per server process, configured from st.secrets,
+together with its cached collection handles and the default collection,
+which is the same for all sessions. Retrieval and ingestion themselves
+live in knowledge_base.
+"""
+
 import streamlit as st
-from chromadb.utils import embedding_functions
 from typing import List, Dict, Any
+from chromadb.errors import ChromaError
+from answer_cache import ANSWER_CACHE_THRESHOLD
+from embedding_backends import DEFAULT_EMBEDDING_BACKEND, LOCAL_EMBEDDING_MODEL
+from index_profiles import DEFAULT_INDEX_PROFILE
+from knowledge_base import QUERY_TIMEOUT_SECONDS, KnowledgeBase, KnowledgeBaseConfig
 
 
 @st.cache_resource
+def get_knowledge_base():
+    """Get the knowledge base shared by all sessions."""
+    return KnowledgeBase(
+        KnowledgeBaseConfig(
+            api_key=st.secrets.get("gen_ai_api_key"),
+            embedding_backend=st.secrets.get("embedding_backend", DEFAULT_EMBEDDING_BACKEND),
+            local_embedding_model=st.secrets.get("local_embedding_model", LOCAL_EMBEDDING_MODEL),
+            index_profile=st.secrets.get("index_profile", DEFAULT_INDEX_PROFILE),
+            answer_cache_threshold=st.secrets.get(
+                "answer_cache_threshold", ANSWER_CACHE_THRESHOLD
+            ),
+            rerank=st.secrets.get("rerank"),
+            hybrid=st.secrets.get("hybrid_search", True),
+            query_timeout=st.secrets.get("query_timeout", QUERY_TIMEOUT_SECONDS),
+        )
+    )
+
+
 def get_chroma_client():
-    """Get or create a ChromaDB client."""
-    os.makedirs("data/chromadb", exist_ok=True)
-    client = chromadb.PersistentClient(path="data/chromadb")
-    return client
+    """Get the ChromaDB client."""
+    return get_knowledge_base().client
 
 
-@st.cache_resource
 def get_embedding_function():
-    """Get the embedding function."""
-    return embedding_functions.GoogleGenerativeAiEmbeddingFunction(
-        api_key=st.secrets["gen_ai_api_key"]
-    )
+    """Get the embedding function of the configured backend.
+
+    Embeddings for queries and ingested chunks are served from the local
+    embedding cache when the same text was embedded before.
+    """
+    return get_knowledge_base().embedding_function
+
+
+def get_embedding_cache_stats():
+    """Get hit/miss counters of the embedding cache for this process."""
+    return get_knowledge_base().embedding_cache_stats()
 
 
 def get_default_collection_name():
-    """Get the default collection name from session state."""
-    if "default_collection" not in st.session_state:
-        # list collections
-        collections = list_collections()
-        if collections:
-            # Use the first collection as default
-            st.session_state.default_collection = collections[0].name
-        else:
-            st.session_state.default_collection = None
-    return st.session_state.default_collection
+    """Get the default collection name, shared by all sessions."""
+    return get_knowledge_base().default_collection_name()
 
 
 def set_default_collection(name: str):
-    """Set the default collection name."""
-    st.session_state.default_collection = name
+    """Set the default collection name for all sessions."""
+    get_knowledge_base().set_default_collection(name)
 
 
 def get_collection(name: str = None):
@@ -50,37 +74,25 @@ def get_collection(name: str = None):
     """
     if name is None:
         name = get_default_collection_name()
+    return get_knowledge_base().get_collection(name)
 
-    client = get_chroma_client()
-    embedding_func = get_embedding_function()
 
-    try:
-        collection = client.get_collection(name=name, embedding_function=embedding_func)
-        return collection
-    except ValueError:
-        return None
-
-
-def create_collection(name: str):
+def create_collection(name: str, embedding_backend: str = None, index_profile: str = None):
     """Create a new ChromaDB collection.
 
     Args:
         name: Collection name to create
+        embedding_backend: Embedding backend of the collection (default from secrets)
+        index_profile: Name of the HNSW index profile (default from secrets)
 
     Returns:
         The newly created ChromaDB collection
     """
     print(f"Creating collection: {name}")
-    client = get_chroma_client()
-    embedding_func = get_embedding_function()
-
     try:
-        collection = client.create_collection(
-            name=name, embedding_function=embedding_func
-        )
-        return collection
-    except ValueError as e:
-        # Collection might already exist
+        return get_knowledge_base().create_collection(name, embedding_backend, index_profile)
+    except (ValueError, ChromaError) as e:
+        # Collection might already exist, or the name or settings are invalid
         st.error(f"Error creating collection: {str(e)}")
         return None
 
@@ -98,11 +110,14 @@ def get_or_create_collection(name: str = None):
     """
     if name is None:
         name = get_default_collection_name()
+    return get_knowledge_base().get_or_create_collection(name)
+
 
-    collection = get_collection(name)
-    if collection is None:
-        collection = create_collection(name)
-    return collection
+def get_collection_space(collection_name: str = None):
+    """Get the distance function ("cosine", "l2" or "ip") of a collection's index."""
+    if collection_name is None:
+        collection_name = get_default_collection_name()
+    return get_knowledge_base().get_collection_space(collection_name)
 
 
 def list_collections():
@@ -111,83 +126,104 @@ def list_collections():
     Returns:
         List of collection names
     """
-    client = get_chroma_client()
-    return client.list_collections()
+    return get_knowledge_base().list_collections()
+
 
+def add_documents(
+    documents: List[Dict[str, Any]],
+    collection_name: str = None,
+    batch_size: int = None,
+    max_workers: int = None,
+    on_progress=None,
+):
+    """Add documents to the ChromaDB collection.
+
+    See KnowledgeBase.add_documents.
+
+    Returns:
+        Dict: {"added": int, "updated": int, "unchanged": int, "deleted": int}
+        chunk counts
 
-def add_documents(documents: List[Dict[str, Any]], collection_name: str = None):
-    """Add documents to the ChromaDB collection."""
+    Raises:
+        IngestionError: If some batches failed after all retries
+    """
     if collection_name is None:
         collection_name = get_default_collection_name()
+    return get_knowledge_base().add_documents(
+        documents, collection_name, batch_size, max_workers, on_progress
+    )
 
-    collection = get_or_create_collection(collection_name)
 
-    # Prepare the data
-    ids = [
-        f"doc_{i}_{documents[i]['metadata'].get('source', 'unknown')}_{documents[i]['metadata'].get('chunk', i)}"
-        for i in range(len(documents))
-    ]
-    texts = [doc["text"] for doc in documents]
-    metadatas = [doc["metadata"] for doc in documents]
+def query_collection(
+    query_text: str,
+    n_results: int = 10,
+    collection_name: str = None,
+    rerank: str = None,
+    hybrid: bool = None,
+):
+    """Query the ChromaDB collection for relevant documents.
 
-    # Add documents to the collection
-    collection.add(ids=ids, documents=texts, metadatas=metadatas)
+    ``rerank`` selects a reranking method and ``hybrid`` whether BM25
+    results are fused in, see KnowledgeBase.query.
+    """
+    if collection_name is None:
+        collection_name = get_default_collection_name()
+    return get_knowledge_base().query(query_text, collection_name, n_results, rerank, hybrid)
 
-    return len(documents)
 
+def lookup_cached_answer(query_text: str, language: str, collection_name: str = None):
+    """Look up a cached answer for a question similar to ``query_text``.
 
-def query_collection(query_text: str, n_results: int = 10, collection_name: str = None):
-    """Query the ChromaDB collection for relevant documents."""
+    Returns:
+        Tuple (answer, similarity) or None
+    """
     if collection_name is None:
         collection_name = get_default_collection_name()
+    return get_knowledge_base().lookup_cached_answer(query_text, language, collection_name)
 
-    collection = get_or_create_collection(collection_name)
 
-    # Query the collection
-    results = collection.query(query_texts=[query_text], n_results=n_results)
+def cache_answer(query_text: str, answer: str, language: str, collection_name: str = None):
+    """Cache the answer generated for ``query_text``."""
+    if collection_name is None:
+        collection_name = get_default_collection_name()
+    get_knowledge_base().cache_answer(query_text, answer, language, collection_name)
 
-    return results
 
+def iter_documents(
+    collection_name: str = None, include=("documents", "metadatas"), where=None
+):
+    """Iterate over the chunks of the collection in pages.
 
-def get_all_documents(collection_name: str = None):
-    """Get all documents from the collection.
+    See KnowledgeBase.iter_documents.
 
-    Returns:
-        Dict containing documents, ids, metadatas, and embeddings
+    Yields:
+        Dict with "ids" and a list per included field
     """
     if collection_name is None:
         collection_name = get_default_collection_name()
+    return get_knowledge_base().iter_documents(collection_name, include, where)
 
-    collection = get_or_create_collection(collection_name)
 
-    # Get all documents (limited to 1000 by default in ChromaDB)
-    results = collection.get()
+def get_all_documents(collection_name: str = None, include=("documents", "metadatas")):
+    """Get all documents from the collection.
 
-    return results
+    Returns:
+        Dict containing ids and the included fields (documents and metadatas by default)
+    """
+    if collection_name is None:
+        collection_name = get_default_collection_name()
+    return get_knowledge_base().get_all_documents(collection_name, include)
 
 
 def get_document_sources(collection_name: str = None):
     """Get a dictionary of document sources with their chunk counts.
 
     Returns:
-        Dict: {source_name: {"chunks": count}}
+        Dict: {source_name: {"chunks", "bytes", "ingested_at", "content_hash"}}
     """
     if collection_name is None:
         collection_name = get_default_collection_name()
-
-    collection = get_or_create_collection(collection_name)
-    results = collection.get()
-
-    sources = {}
-    if results and "metadatas" in results and results["metadatas"]:
-        for metadata in results["metadatas"]:
-            if "source" in metadata:
-                source = metadata["source"]
-                if source not in sources:
-                    sources[source] = {"chunks": 0}
-                sources[source]["chunks"] += 1
-
-    return sources
+    return get_knowledge_base().get_document_sources(collection_name)
 
 
 def delete_document(source: str, collection_name: str = None):
@@ -202,18 +238,7 @@ def delete_document(source: str, collection_name: str = None):
     """
     if collection_name is None:
         collection_name = get_default_collection_name()
-
-    collection = get_or_create_collection(collection_name)
-
-    # Get documents with the specified source
-    results = collection.get(where={"source": source})
-
-    if results and "ids" in results and results["ids"]:
-        # Delete the documents
-        collection.delete(ids=results["ids"])
-        return len(results["ids"])
-
-    return 0
+    return get_knowledge_base().delete_document(source, collection_name)
 
 
 def clear_collection(collection_name: str = None):
@@ -225,9 +250,7 @@ def clear_collection(collection_name: str = None):
     try:
         if collection_name is None:
             collection_name = get_default_collection_name()
-
-        collection = get_or_create_collection(collection_name)
-        collection.delete()
+        get_knowledge_base().clear_collection(collection_name)
         return True
     except Exception:
         return False
@@ -243,8 +266,7 @@ def delete_collection(name: str):
         bool: True if successful, False otherwise
     """
     try:
-        client = get_chroma_client()
-        client.delete_collection(name)
+        get_knowledge_base().delete_collection(name)
         return True
     except Exception:
         return False